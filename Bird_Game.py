@@ -1,40 +1,53 @@
 import pygame
 import time
-import serial
-import csv
 import random
 import os
-import threading
-
-
-pygame.init()
+from collections import OrderedDict
+from configparser import ConfigParser
+
+from bird_sim import BirdSimulation, EVENT_MESSAGES, FRAME_RATE, top_up_foods
+from event_logger import AsyncCsvLogger
+from force_reader import ForceRecorder
+from frame_timing import FrameTimer, sidecar_path
+from log_schema import COLUMNS as LOG_COLUMNS, make_row, write_settings
+from psychophysics import make_method
+from serial_io import SerialConnector, SerialWorker
+from session_state import (SessionState, Checkpointer, abandon_checkpoint, checkpoint_path, find_resumable,
+                           last_timestamp, load_checkpoint, repair_log, truncate_log,
+                           PHASE_STAIRCASE, PHASE_GAME, PHASE_DONE)
+from vibration_scheduler import VibrationScheduler
+
+# Importing this module only defines things; launch() reads the config,
+# opens the window and starts connecting to the Arduino.
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bird_game.ini")
 
 message_display_duration = 2
 shot_times = []
 
-arduino_port = 'COM4'
+arduino_port = 'auto'  # or a device name such as 'COM4'
 baud_rate = 115200
+ser = None
+serial_connector = None
 
-try:
-    ser = serial.Serial(arduino_port, baud_rate, timeout=1)
-    print(f"Connected to Arduino on {arduino_port}")
-except Exception as e:
-    print(f"Could not connect to Arduino: {e}")
-    ser = None
-
-# Global variable for force data file path
+# Framed vibration commands with acknowledgements need firmware that answers
+# them (see serial_io.py); the current sketch reads plain "N\n" lines.
+SERIAL_FRAMED_PROTOCOL = False
 
 
 EXPERIMENT_SCREEN_WIDTH = 1920
 EXPERIMENT_SCREEN_HEIGHT = 1080
 BACKGROUND_COLOR = (255, 255, 255)
 TEXT_COLOR = (0, 0, 0)
+FONT_SIZE = 36
+TEXT_CACHE_SIZE = 256  # rendered text surfaces kept in memory
 
+staircase_method = 'quest'  # 'quest', 'psi' or 'updown' (see psychophysics.py)
 initial_intensity = 2
 min_intensity = 2
 max_intensity = 20
-total_staircase_trials = 20
+total_staircase_trials = 20  # at most; QUEST and Psi stop once the threshold is known
 step_size = 1
+RESPONSE_WINDOW = 5  # seconds to respond to a staircase vibration
 
 total_experiment_trials = 1
 
@@ -52,30 +65,17 @@ wall_y = 50
 wall_width = 50
 wall_height = 600
 hole_height = 100
-hole_y = wall_y
 hole_speed = 10
+# Frames per second of the game loop; the simulation steps one frame per
+# pass, so this also sets how fast the hole moves in real time.
+frame_rate = FRAME_RATE
 
 bird_x = wall_x + 200
 bird_y = GAME_SCREEN_HEIGHT // 3
 
 food_speed = 30
-foods_in_motion = []
-computer_food_in_motion = False
-button_pressed = False
-score = 0
-
-last_shot_time = 0
-last_computer_shot_time = 0
 computer_shot_interval = 5
-shot_interval = 3
-hole_y_direction = 1
-speed_setting = 'hard'
-vibro_tactile_feedback = False
-beak_open = True
-beak_open_time = 0
-
-current_level = 1
-foods_fed = 0
+cooldown_time = 700
 
 total_trials = 10000
 player_shot_percentage = 80
@@ -83,53 +83,97 @@ computer_shot_percentage = 20
 player_shots = total_trials * player_shot_percentage // 100
 computer_shots = total_trials * computer_shot_percentage // 100
 current_trial = 0
-remaining_player_shots = player_shots
-remaining_computer_shots = computer_shots
 
 message_text = ""
 message_display_start_time = 0
 message_display_duration = 2
 
-screen = pygame.display.set_mode((GAME_SCREEN_WIDTH, GAME_SCREEN_HEIGHT))
-pygame.display.set_caption("Vibration Experiment and Feed the Bird Game")
-
-# Define the optimal window for a successful shot:
-optimal_min = bird_y - hole_height  # lowest value for hole_y
-optimal_max = bird_y  # highest value for hole_y
-stop_event = threading.Event()  # Create a threading event to stop the thread safely
-
-print(f"Optimal window for hole_y: {optimal_min} to {optimal_max}")
-
-# This function will be used to continuously read force data from the Arduino
-def read_force_data(force_data_filename):
-    with open(force_data_filename, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Timestamp', 'Force'])  # Write headers if file is empty
-
-        while not stop_event.is_set():  # Run until stop_event is set
-            if ser and ser.is_open and ser.in_waiting > 0:  # Check if serial is still open
-                raw_data = ser.readline()  # Read raw data
-                #print(f"Raw Data: {raw_data}")  # Debug print
-                try:
-                    force_value = raw_data.decode('utf-8').strip()
-                    current_time = time.time() * 1000
-                    writer.writerow([current_time, force_value])
-                    #print(f"Force value: {force_value}, Time: {current_time:.2f} ms")
-                except serial.SerialException as e:
-                    print(f"SerialException: {e}. Exiting thread.")
-                    break  # Exit the loop if serial error occurs
-                except UnicodeDecodeError as e:
-                    print(f"Decoding Error: {e}, Raw Data: {raw_data}")  # Debugging error
-                time.sleep(0.1)  # Delay to avoid excessive reads
-    print("Force data thread has stopped.")
+screen = None
+force_recorder = None
+serial_worker = None
+
+# Config file keys and the module settings they override
+CONFIG_SETTINGS = {
+    ('serial', 'port'): ('arduino_port', str),
+    ('serial', 'baud_rate'): ('baud_rate', int),
+    ('serial', 'framed_protocol'): ('SERIAL_FRAMED_PROTOCOL', bool),
+    ('staircase', 'method'): ('staircase_method', str),
+    ('staircase', 'initial_intensity'): ('initial_intensity', int),
+    ('staircase', 'min_intensity'): ('min_intensity', int),
+    ('staircase', 'max_intensity'): ('max_intensity', int),
+    ('staircase', 'trials'): ('total_staircase_trials', int),
+    ('staircase', 'step_size'): ('step_size', int),
+    ('game', 'hole_height'): ('hole_height', int),
+    ('game', 'hole_speed'): ('hole_speed', int),
+    ('game', 'frame_rate'): ('frame_rate', int),
+    ('game', 'food_speed'): ('food_speed', int),
+    ('game', 'computer_shot_interval'): ('computer_shot_interval', int),
+    ('game', 'cooldown_time'): ('cooldown_time', int),
+    ('game', 'total_trials'): ('total_trials', int),
+    ('game', 'player_shot_percentage'): ('player_shot_percentage', int),
+}
+
+
+def load_config(path=CONFIG_FILE):
+    """Overrides the module settings with those in `path`, if it exists."""
+    global player_shots, computer_shots, computer_shot_percentage
+    config = ConfigParser()
+    if not config.read(path):
+        return
+    for (section, key), (name, kind) in CONFIG_SETTINGS.items():
+        if config.has_option(section, key):
+            if kind is bool:
+                value = config.getboolean(section, key)
+            else:
+                value = kind(config.get(section, key))
+            globals()[name] = value
+    computer_shot_percentage = 100 - player_shot_percentage
+    player_shots = total_trials * player_shot_percentage // 100
+    computer_shots = total_trials * computer_shot_percentage // 100
+
+
+def init_display():
+    """Starts only the pygame subsystems the game uses and opens the window."""
+    global screen
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((GAME_SCREEN_WIDTH, GAME_SCREEN_HEIGHT))
+    pygame.display.set_caption("Vibration Experiment and Feed the Bird Game")
+    return screen
+
+
+def connect_serial():
+    """Starts looking for the Arduino in the background."""
+    global serial_connector
+    serial_connector = SerialConnector(arduino_port, baud_rate).start()
+
+
+def wait_for_serial():
+    """Waits for the background connection, keeping the window responsive."""
+    global ser
+    clock = pygame.time.Clock()
+    while not serial_connector.done():
+        screen.fill(BACKGROUND_COLOR)
+        display_text(screen, "Connecting to the vibration device...", 100, 200)
+        pygame.display.flip()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+        clock.tick(30)
+    ser = serial_connector.ser
+    if ser:
+        print(f"Connected to Arduino on {serial_connector.port}")
+    else:
+        print(f"Could not connect to Arduino: {serial_connector.error}")
 
 def stop_recording():
     """Stops the force data recording thread safely."""
     print("Stopping force data recording...")
-    stop_event.set()  # Signal the thread to stop
-
-    # Wait for the thread to finish (small delay to ensure it stops)
-    time.sleep(0.2)
+    if serial_worker:
+        serial_worker.stop()  # Writes queued commands, then releases the port
+    if force_recorder:
+        force_recorder.stop()  # Waits until every buffered sample is written
 
     if ser and ser.is_open:
         ser.close()  # Close the serial connection safely
@@ -139,42 +183,77 @@ def start_recording(subject_name):
     """ Starts a separate thread for recording force data using the subject's name. """
     sanitized_name = ''.join(char if char.isalnum() else '_' for char in subject_name)
 
-    force_data_filename = f"force_data_{sanitized_name}.csv"
+    force_data_filename = f"force_data_{sanitized_name}.force"
 
     # Check if a duplicate file exists and rename it if needed
     counter = 1
     while os.path.exists(force_data_filename):
-        force_data_filename = f"force_data_{sanitized_name}_{counter}.csv"
+        force_data_filename = f"force_data_{sanitized_name}_{counter}.force"
         counter += 1
 
-    # Start the thread to record force data
-    force_thread = threading.Thread(target=read_force_data, args=(force_data_filename,))
-    force_thread.daemon = True  # Ensure the thread closes when the main program exits
-    force_thread.start()
+    # Start the threads that write and read force data
+    global force_recorder, serial_worker
+    force_recorder = ForceRecorder(force_data_filename)
+    force_recorder.start()
+    if ser:
+        serial_worker = SerialWorker(ser, on_samples=force_recorder.add_samples, framed=SERIAL_FRAMED_PROTOCOL)
+        serial_worker.start()
 
 
-def log_response(response=None, intensity=None, event_type=None, csv_writer=None, timestamp=None, score=None):
+def log_response(response=None, intensity=None, event_type=None, csv_writer=None, timestamp=None, score=None,
+                 hole_y=None, predicted_hole_y=None, optimal=None, scheduled_time=None):
 
     if timestamp is None:
         timestamp = time.time() * 1000
 
+    csv_writer.writerow(make_row(event_type, timestamp, response, intensity,
+                                 hole_y, predicted_hole_y, optimal, score, scheduled_time))
 
-    csv_writer.writerow([timestamp, response, intensity, event_type, score])
 
+def send_vibration_intensity(intensity, on_written=None):
+    # Only queues the command; the serial worker thread does the write and
+    # reports when it did through on_written(written_ms). Once the port has
+    # failed the row is logged here, as without a port
+    if serial_worker and not serial_worker.dead:
+        serial_worker.send_intensity(intensity, on_written)
+    elif on_written:
+        on_written(time.time() * 1000)
 
-def send_vibration_intensity(intensity):
-    if ser and ser.is_open:
-        ser.write(f"{intensity}\n".encode())
-        print(f"Sent intensity: {intensity}")
+
+fonts = {}
+text_cache = OrderedDict()
 
 
-def display_text(screen, text, x, y):
-    """Displays text on the Pygame screen."""
-    font = pygame.font.SysFont(None, 36)
+def get_font(size=FONT_SIZE):
+    """Returns the default font at `size`, looking it up only once."""
+    font = fonts.get(size)
+    if font is None:
+        font = pygame.font.SysFont(None, size)
+        fonts[size] = font
+    return font
+
+
+def render_text(line, size=FONT_SIZE, color=TEXT_COLOR):
+    """Renders one line of text, reusing recently rendered surfaces (LRU)."""
+    key = (line, size, color)
+    rendered_text = text_cache.get(key)
+    if rendered_text is None:
+        rendered_text = get_font(size).render(line, True, color)
+        text_cache[key] = rendered_text
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)  # Evict the least recently used
+    else:
+        text_cache.move_to_end(key)
+    return rendered_text
+
+
+def display_text(screen, text, x, y, size=FONT_SIZE, color=TEXT_COLOR):
+    """Displays text on the Pygame screen and returns the area it covers."""
     lines = text.split('\n')
+    area = pygame.Rect(x, y, 0, 0)
     for i, line in enumerate(lines):
-        rendered_text = font.render(line, True, TEXT_COLOR)
-        screen.blit(rendered_text, (x, y + i * 40))
+        area.union_ip(screen.blit(render_text(line, size, color), (x, y + i * 40)))
+    return area
 
 def show_instructions(screen, instruction_text):
 
@@ -183,6 +262,7 @@ def show_instructions(screen, instruction_text):
     display_text(screen, "Press any key to continue...", 100, 500)
     pygame.display.flip()
 
+    clock = pygame.time.Clock()
     waiting = True
     while waiting:
         for event in pygame.event.get():
@@ -191,13 +271,25 @@ def show_instructions(screen, instruction_text):
                 exit()
             elif event.type == pygame.KEYDOWN:
                 waiting = False
-        pygame.time.Clock().tick(30)
+        clock.tick(30)
+
+
+def ask_resume(state):
+    """Asks whether to continue an unfinished session."""
+    screen.fill(BACKGROUND_COLOR)
+    display_text(screen, "An unfinished session was found for this name.", 100, 200)
+    if state.level is not None:
+        display_text(screen, f"Level {state.level}, score {state.score}.", 100, 250)
+    display_text(screen, "Press Y to continue it or N to start a new session.", 100, 300)
+    pygame.display.flip()
+    return wait_for_key(keys=(pygame.K_y, pygame.K_n)) == pygame.K_y
 
 
 def get_subject_name(screen):
 
     name = ""
     input_active = True
+    clock = pygame.time.Clock()
 
     while input_active:
         screen.fill(BACKGROUND_COLOR)
@@ -223,267 +315,162 @@ def get_subject_name(screen):
                         if event.unicode.isalnum() or event.unicode == ' ':
                             name += event.unicode
 
-        pygame.time.Clock().tick(30)
+        clock.tick(30)
 
     return name.strip()
 
 
-def run_staircase_procedure(csv_writer):
+FOOT_KEYS = (pygame.K_RIGHT, pygame.K_UP, pygame.K_LEFT)
+
+
+def wait_for_key(timeout=None, keys=None):
+    """Sleeps until one of `keys` (any key if None) is pressed or `timeout`
+    seconds pass, without busy-looping. Returns the key pressed, or None."""
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+        if deadline is None:
+            event = pygame.event.wait()
+        else:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            event = pygame.event.wait(max(1, int(remaining * 1000)))
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            exit()
+        elif event.type == pygame.KEYDOWN and (keys is None or event.key in keys):
+            return event.key
+        elif event.type == pygame.WINDOWEXPOSED:
+            pygame.display.flip()
 
-    global current_trial
-    trial_count = 0
-    intensity = initial_intensity
-    last_trial_time = time.time()
-    random_interval = random.randint(1, 10)
 
+def run_staircase_procedure(csv_writer):
+    """Estimates the detection threshold with the configured adaptive method.
 
-    reversals = []
-    previous_direction = None
-    reversal_limit = 10
+    The screen is drawn once per trial; between vibrations the loop sleeps
+    in pygame.event.wait instead of redrawing."""
+    method = make_method(staircase_method, total_staircase_trials, initial_intensity,
+                         min_intensity, max_intensity, step_size)
 
-    while trial_count < total_staircase_trials:
+    while not method.done():
+        trial = method.trial_count + 1
         screen.fill(BACKGROUND_COLOR)
-        display_text(screen, f"Staircase Procedure: Trial {trial_count + 1}/{total_staircase_trials}", 150, 100)
+        display_text(screen, f"Staircase Procedure: Trial {trial}", 150, 100)
         display_text(screen, "Press any foot key (Right, Up, Left) if you detected vibration.", 150, 300)
         display_text(screen, "Do NOT press any key if you did NOT detect vibration.", 150, 350)
-
         pygame.display.flip()
 
-        current_time = time.time()
-
-        if current_time - last_trial_time >= random_interval:
-            send_vibration_intensity(intensity)
-            trial_count += 1
-            last_trial_time = current_time
-            random_interval = random.randint(1, 10)
+        # Random pause before the vibration; presses in it are not responses
+        wait_for_key(random.randint(1, 10), keys=())
+        pygame.event.clear(pygame.KEYDOWN)
 
-            response = 0
-            response_start_time = time.time()
-            response_window = 5
+        intensity = method.next_intensity()
+        send_vibration_intensity(intensity)
+        response = 1 if wait_for_key(RESPONSE_WINDOW, keys=FOOT_KEYS) else 0
+        log_response(response, intensity, "Staircase Procedure", csv_writer)
+        method.update(intensity, response)
 
-            while time.time() - response_start_time < response_window:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        exit()
-                    elif event.type == pygame.KEYDOWN:
-                        if event.key in [pygame.K_RIGHT, pygame.K_UP, pygame.K_LEFT]:
-                            response = 1
-                            break
-
-                if response == 1:
-                    break
-
-                pygame.display.flip()
-                pygame.time.Clock().tick(30)
-
-            log_response(response, intensity, "Staircase Procedure", csv_writer)
-
-            if response == 1:
-                new_intensity = max(min_intensity, intensity - step_size)  # Decrease intensity
-                direction = "down"
-            else:
-                new_intensity = min(max_intensity, intensity + step_size)  # Increase intensity
-                direction = "up"
-
-            if previous_direction and direction != previous_direction:
-                reversals.append(intensity)
-                print(f"Reversal at intensity: {intensity}")
-
-            previous_direction = direction
-            intensity = new_intensity
-
-    if len(reversals) >= reversal_limit:
-        threshold = sum(reversals[-reversal_limit:]) / reversal_limit
-    elif reversals:
-        threshold = sum(reversals) / len(reversals)
-    else:
-        threshold = intensity
+    threshold = round(method.threshold(), 2)
+    print(f"Staircase ({staircase_method}) finished after {method.trial_count} trials")
 
     screen.fill(BACKGROUND_COLOR)
     display_text(screen, "Staircase Procedure Completed!", 200, 250)
     display_text(screen, f"Estimated Absolute Threshold: {threshold:.2f}", 200, 300)
     display_text(screen, "Press any key to continue to Experiments.", 150, 350)
     pygame.display.flip()
-
-    waiting = True
-    while waiting:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-            elif event.type == pygame.KEYDOWN:
-                waiting = False
-        pygame.display.flip()
-        pygame.time.Clock().tick(30)
+    wait_for_key()
 
     return threshold
 
-def draw_wall_with_hole(screen, wall_x, wall_y, hole_y, hole_height):
-    pygame.draw.rect(screen, WALL_COLOR, (wall_x, wall_y, wall_width, wall_height))
-    pygame.draw.rect(screen, RED_HOLE_COLOR, (wall_x, hole_y, wall_width, hole_height))
+def draw_hole(screen, wall_x, hole_y, hole_height):
+    return pygame.draw.rect(screen, RED_HOLE_COLOR, (wall_x, hole_y, wall_width, hole_height))
 
 
-def draw_bird(screen, x, y, beak_open):
+def draw_bird_body(screen, x, y):
     pygame.draw.ellipse(screen, BIRD_COLOR, (x - 30, y - 20, 60, 40))
     pygame.draw.circle(screen, (0, 0, 0), (x - 15, y - 10), 5)
-    if beak_open:
-        pygame.draw.polygon(screen, BEAK_COLOR, [(x - 30, y), (x - 50, y - 10), (x - 50, y + 10)])
-    else:
-        pygame.draw.polygon(screen, BEAK_COLOR, [(x - 30, y), (x - 40, y - 5), (x - 40, y + 5)])
-
-def update_food_position():
-    global foods_in_motion, score, message_text, foods_fed, current_level, message_display_duration
-    global game_over, running_game
-
-    for food in foods_in_motion[:]:
-        pygame.draw.circle(screen, FOOD_COLOR, (food['x'], food['y']), 10)
-        food['x'] += food_speed
-
-        if food['x'] >= wall_x:
-            if not food['passing_hole'] and hole_y <= food['y'] <= hole_y + hole_height:
-                food['passing_hole'] = True
-            elif not food['passing_hole'] and food['player_shot']:
-                message_text = "Hit the Wall!"
-                score -= 1
-                foods_in_motion.remove(food)
-
-        if food['x'] >= bird_x - 30:
-            if food['player_shot']:
-                if beak_open:
-                    message_text = "Fed the Bird!"
-                    score += 10
-                    foods_fed += 1
-                else:
-                    message_text = "Missed the Bird!"
-                    score -= 5
-            else:
-                if beak_open:
-                    message_text = "Computer Fed the Bird!"
-                    score -= 5
-                else:
-                    message_text = "Player Blocked the Bird!"
-                    score += 5
-            foods_in_motion.remove(food)
-
-
-    # Stop the game after feeding 300 times
-    if foods_fed == 50:
-        foods_fed = 0
-        if current_level == 1:
-            current_level += 1
-            level_up_to_2()
-        elif current_level == 2:
-            current_level += 1
-            level_up_to_3()
-        elif current_level == 3:
-            message_text = f"Game Over! Final Score: {score}"
-            print(message_text)  # Debugging
-            display_text(screen, message_text, 400, 300)
 
-            pygame.display.flip()  # Update the display to show the final score
-            pygame.time.delay(3000)  # Keep the final score on screen for 3 seconds
-
-            game_over = True
-            running_game = False
-            return
-
-def level_up_to_2():
-    global hole_speed, message_text, message_display_start_time, food_speed, message_display_duration
-    message_text = "Congratulations! Level 2: Speeding Up!"
-    #pygame.mixer.Sound.play(congratulations_sound)  # Play the congratulatory sound
-    message_display_start_time = time.time()
-    message_display_duration = 5  # Increase display duration for level-up message
-    hole_speed += 4  # Increase hole speed to make it harder
-    food_speed += 2  # Optionally increase food speed as well
-    print("Level up: Speeding up the hole")
-
-def level_up_to_3():
-    global hole_height, message_text, message_display_start_time, message_display_duration
-    message_text = "Congratulations! Level 3: Narrowing the Hole!"
-    # pygame.mixer.Sound.play(congratulations_sound)  # Play the congratulatory sound
-    message_display_start_time = time.time()
-    message_display_duration = 5  # Increase display duration for level-up message
-    hole_height -= 10  # Reduce the height of the hole to make it harder
-    print("Level up: Narrowing the hole")
-def handle_player_shoot(csv_writer=None, threshold_intensity=4):
-    global foods_in_motion, last_shot_time, vibro_tactile_feedback, foods_fed, current_trial, remaining_player_shots, beak_open
-    global shot_times, vibration_times
-
-    food_x = 100
-    food_y = bird_y
-    foods_in_motion.append({'x': food_x, 'y': food_y, 'passing_hole': False, 'player_shot': True})
-
-    current_time = time.time() * 1000
-    shot_times.append(current_time)
-    last_shot_time = current_time
-    vibro_tactile_feedback = True
-
-    if len(shot_times) > 1:
-        interval = shot_times[-1] - shot_times[-2]
-        predicted_next_shot = shot_times[-1] + interval
-
-        vibration_time = predicted_next_shot - 50
-
-        vibration_times.append(vibration_time)
-
-
-        print(f"Player shot at: {current_time} ms")
-        print(f"Predicted next shot at: {predicted_next_shot} ms")
-        print(f"Vibration scheduled at: {vibration_time} ms before predicted shot")
-    else:
-        print(f"Player shot at: {current_time} ms")
-
-
-def handle_computer_shoot(csv_writer=None):
-    global foods_in_motion, last_computer_shot_time, remaining_computer_shots
-    current_time = time.time()*1000
-    if current_time - last_computer_shot_time >= computer_shot_interval and remaining_computer_shots > 0:
-        food_x = 100
-        food_y = bird_y
-        foods_in_motion.append({'x': food_x, 'y': food_y, 'passing_hole': False, 'player_shot': False})
-        last_computer_shot_time = current_time
-        remaining_computer_shots -= 1
-        print(f"Computer shot at {current_time} ms")
-
-vibration_times = []
-last_shot_time = 0
-cooldown_time = 700
 
+def draw_beak(screen, x, y, beak_open):
+    if beak_open:
+        return pygame.draw.polygon(screen, BEAK_COLOR, [(x - 30, y), (x - 50, y - 10), (x - 50, y + 10)])
+    return pygame.draw.polygon(screen, BEAK_COLOR, [(x - 30, y), (x - 40, y - 5), (x - 40, y + 5)])
+
+
+def build_static_layer():
+    """Pre-renders the parts of the game screen that never change
+    (wall, shoot button and bird body) onto a background surface."""
+    background = pygame.Surface((GAME_SCREEN_WIDTH, GAME_SCREEN_HEIGHT)).convert()
+    background.fill(BACKGROUND_COLOR)
+    pygame.draw.rect(background, WALL_COLOR, (wall_x, wall_y, wall_width, wall_height))
+    pygame.draw.rect(background, BUTTON_COLOR, (50, 333, 100, 50))
+    display_text(background, "Shoot", 60, 343)
+    draw_bird_body(background, bird_x, bird_y)
+    return background
+
+def new_simulation():
+    """Creates the game-logic simulation with this experiment's settings."""
+    return BirdSimulation(hole_speed=hole_speed, hole_height=hole_height, food_speed=food_speed,
+                          wall_x=wall_x, wall_y=wall_y, wall_height=wall_height,
+                          bird_x=bird_x, bird_y=bird_y,
+                          player_shots=player_shots, computer_shots=computer_shots,
+                          computer_shot_interval=computer_shot_interval, cooldown_time=cooldown_time,
+                          frame_rate=frame_rate)
+
+
+def draw_foods(screen, foods):
+    xs, ys = foods.positions()
+    return [pygame.draw.circle(screen, FOOD_COLOR, (x, y), 10) for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def run_game(csv_writer, threshold_intensity, timing_filename=None, state=None, checkpointer=None):
+    global message_text, message_display_start_time, message_display_duration
+
+    sim = new_simulation()
+    if state:
+        state.restore(sim)  # Resuming a crashed session
+        log_offset = state.log_rows or 0
+        if sim.in_optimal_window:
+            # Close the window the crash interrupted where the log stops; the
+            # resumed game opens a new one on its first optimal frame
+            log_response(None, threshold_intensity, "OptimalWindowEnd", csv_writer,
+                         timestamp=last_timestamp(state.csv_filename))
+            sim.in_optimal_window = False
+    game_over = False
+    running_game = True
 
-def run_game(csv_writer, threshold_intensity):
-    global beak_open, hole_speed, hole_height, hole_y, hole_y_direction, message_text
-    global score, foods_fed, current_level, food_speed, current_trial, remaining_player_shots, remaining_computer_shots, game_over
-    global vibration_times, message_display_duration, last_shot_time, cooldown_time
+    # Only the rectangles drawn on the previous frame are restored from the
+    # static layer and presented again, instead of redrawing the whole screen
+    background = build_static_layer()
+    screen.blit(background, (0, 0))
+    pygame.display.flip()
+    dirty_rects = []
 
+    def vibration_fired(scheduled_time, actual_time, intensity):
+        log_response(None, intensity, "VibrationSent", csv_writer, timestamp=actual_time,
+                     scheduled_time=scheduled_time)
+        print(f"Vibration triggered at {actual_time:.0f} ms ({actual_time - scheduled_time:+.2f} ms late)")
 
+    vibrations = VibrationScheduler(send_vibration_intensity, on_fire=vibration_fired)
+    vibrations.start()
 
-    game_over = False
-    running_game = True
+    clock = pygame.time.Clock()
+    timer = FrameTimer(['events', 'simulate', 'draw', 'present', 'wait'], target_fps=frame_rate)
 
     print("Game started. Press '1' to shoot.")
 
     while running_game:
-        screen.fill(BACKGROUND_COLOR)
-
         if game_over:
+            screen.fill(BACKGROUND_COLOR)
             display_text(screen, message_text, 400, 300)
             pygame.display.flip()
             pygame.time.wait(3000)
             running_game = False
             continue
 
+        timer.start_frame()
         current_time = time.time() * 1000
 
-        # Process scheduled vibrations
-        if vibration_times and current_time >= vibration_times[0]:
-            send_vibration_intensity(threshold_intensity)
-            log_response(None, threshold_intensity, "VibrationSent", csv_writer, timestamp=current_time)
-            print(f"Vibration triggered at {current_time:.0f} ms")
-            vibration_times.pop(0)
-
-        shot_occurred = False  # Flag to detect if a shot event occurs this frame
-
         # Process events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -491,106 +478,145 @@ def run_game(csv_writer, threshold_intensity):
             elif event.type == pygame.KEYDOWN:
                 if event.key in (pygame.K_RIGHT, pygame.K_UP, pygame.K_LEFT):
                     log_response(1, threshold_intensity, "FootPedalPress", csv_writer, timestamp=current_time)
+                    timer.input_logged()
                 elif event.key in (pygame.K_1, pygame.K_KP1):
-                    if current_time - last_shot_time >= cooldown_time:
-                        # Compute travel time and predicted hole position with bouncing logic:
-                        food_start_x = 100  # where food is shot from
-                        T_travel = (wall_x - food_start_x) / food_speed  # in seconds
-                        lower_bound = wall_y
-                        upper_bound = wall_y + wall_height - hole_height
-                        L = upper_bound - lower_bound
-                        # Compute current effective position (relative to lower_bound)
-                        x0_prime = hole_y - lower_bound
-                        # Displacement during travel (including direction)
-                        s = hole_speed * T_travel * hole_y_direction
-                        # Reflect the new position within the allowed range:
-                        x_eff = ((x0_prime + s) % (2 * L))
-                        if x_eff > L:
-                            predicted_hole_y = lower_bound + (2 * L - x_eff)
-                        else:
-                            predicted_hole_y = lower_bound + x_eff
-
-                        # Define the optimal window:
-                        optimal_min = bird_y - hole_height
-                        optimal_max = bird_y
-                        optimal_flag = (optimal_min <= predicted_hole_y <= optimal_max)
-
+                    shot = sim.player_shoot(current_time)
+                    if shot:
                         # Log the player's shot with optimal moment info:
-                        event_detail = (f"PlayerShoot; current_hole_y={hole_y:.2f}; "
-                                        f"predicted_hole_y={predicted_hole_y:.2f}; optimal={optimal_flag}")
-                        score_detail= (f"Score={score:.2f}; ")
-                        log_response(None, threshold_intensity, event_detail, csv_writer, timestamp=current_time, score=score_detail)
-                        print(f"Player shot at {current_time:.0f} ms, current hole_y: {hole_y:.2f}, predicted hole_y: {predicted_hole_y:.2f}, optimal: {optimal_flag}")
-
-                        handle_player_shoot(csv_writer, threshold_intensity)
-                        current_trial += 1
-                        remaining_player_shots -= 1
-                        last_shot_time = current_time
-                        shot_occurred = True
+                        log_response(None, threshold_intensity, "PlayerShoot", csv_writer, timestamp=current_time,
+                                     score=shot.data['score'], hole_y=shot.data['current_hole_y'],
+                                     predicted_hole_y=shot.data['predicted_hole_y'], optimal=shot.data['optimal'])
+                        timer.input_logged()
+                        print(f"Player shot at {current_time:.0f} ms, current hole_y: {shot.data['current_hole_y']:.2f}, "
+                              f"predicted hole_y: {shot.data['predicted_hole_y']:.2f}, optimal: {shot.data['optimal']}")
                     else:
                         print("Shot ignored. Please wait before shooting again.")
                 elif event.key in (pygame.K_3, pygame.K_KP3):
-                    beak_open = False
+                    sim.close_mouth(current_time)
                     log_response(None, None, "CloseMouth", csv_writer, timestamp=current_time)
+                    timer.input_logged()
             elif event.type == pygame.KEYUP:
                 if event.key in (pygame.K_3, pygame.K_KP3):
-                    beak_open = True
-
-        # --- Update the hole position with boundary check and computer shoot ---
-        hole_y += hole_speed * hole_y_direction
-        if hole_y <= wall_y:
-            hole_y_direction = 1
-        elif hole_y + hole_height >= wall_y + wall_height:
-            hole_y_direction = -1
-            handle_computer_shoot(csv_writer)
-            log_response(None, threshold_intensity, "ComputerShoot", csv_writer, timestamp=current_time)
-
-        # --- Calculate predicted hole position with bouncing logic ---
-        food_start_x = 100  # where food is shot from
-        T_travel = (wall_x - food_start_x) / food_speed  # in seconds
-        lower_bound = wall_y
-        upper_bound = wall_y + wall_height - hole_height
-        L = upper_bound - lower_bound
-        x0_prime = hole_y - lower_bound
-        s = hole_speed * T_travel * hole_y_direction
-        x_eff = ((x0_prime + s) % (2 * L))
-        if x_eff > L:
-            predicted_hole_y = lower_bound + (2 * L - x_eff)
-        else:
-            predicted_hole_y = lower_bound + x_eff
-
-        optimal_min = bird_y - hole_height
-        optimal_max = bird_y
-
-        # Log an optimal moment if no shot occurred this frame and predicted hole is optimal:
-        if (not shot_occurred) and (optimal_min <= predicted_hole_y <= optimal_max):
-            log_response("NoShot", threshold_intensity,
-                         f"OptimalMoment; current_hole_y={hole_y:.2f}; predicted_hole_y={predicted_hole_y:.2f}",
-                         csv_writer, timestamp=time.time() * 1000)
-            print(f"Optimal moment logged: current_hole_y={hole_y:.2f}, predicted_hole_y={predicted_hole_y:.2f}")
+                    sim.open_mouth(current_time)
+                    log_response(None, None, "OpenMouth", csv_writer, timestamp=current_time)
+                    timer.input_logged()
+        timer.mark('events')
+
+        # Hand vibrations scheduled by this frame's shots to the scheduler thread
+        for vibration_time in sim.take_vibrations():
+            vibrations.schedule(vibration_time, threshold_intensity)
+
+        # --- Move the hole and foods, then log what happened ---
+        for sim_event in sim.advance(current_time):
+            if sim_event.kind == 'ComputerShoot':
+                log_response(None, threshold_intensity, "ComputerShoot", csv_writer, timestamp=current_time)
+            elif sim_event.kind in ('OptimalWindowStart', 'OptimalWindowEnd'):
+                # Only the window edges are logged; the analysis loaders
+                # expand them back into per-frame OptimalMoment rows
+                log_response(None, threshold_intensity, sim_event.kind, csv_writer, timestamp=time.time() * 1000,
+                             hole_y=sim_event.data['current_hole_y'],
+                             predicted_hole_y=sim_event.data['predicted_hole_y'])
+            elif sim_event.kind in EVENT_MESSAGES:
+                message_text = EVENT_MESSAGES[sim_event.kind]
+            elif sim_event.kind == 'LevelUp':
+                if sim_event.data['level'] == 2:
+                    message_text = "Congratulations! Level 2: Speeding Up!"
+                    print("Level up: Speeding up the hole")
+                else:
+                    message_text = "Congratulations! Level 3: Narrowing the Hole!"
+                    print("Level up: Narrowing the hole")
+                message_display_start_time = time.time()
+                message_display_duration = 5  # Increase display duration for level-up message
+            elif sim_event.kind == 'GameOver':
+                message_text = f"Game Over! Final Score: {sim_event.data['score']}"
+                print(message_text)  # Debugging
+                game_over = True
+        if checkpointer:
+            # Only copies a few numbers; the checkpointer thread does the writing
+            state.capture(sim, log_offset + getattr(csv_writer, 'rows_queued', 0))
+            checkpointer.submit(state)
+        timer.mark('simulate')
 
         # --- Draw game objects ---
-        draw_wall_with_hole(screen, wall_x, wall_y, hole_y, hole_height)
-        draw_bird(screen, bird_x, bird_y, beak_open)
-        pygame.draw.rect(screen, BUTTON_COLOR, (50, 333, 100, 50))
-        display_text(screen, "Shoot", 60, 343)
-        update_food_position()
-        display_text(screen, f"Score: {score}", 1000, 50)
+        for rect in dirty_rects:
+            screen.blit(background, rect, rect)
+        changed_rects = [
+            draw_hole(screen, wall_x, sim.hole_y, sim.hole_height),
+            draw_beak(screen, bird_x, bird_y, sim.beak_open),
+        ]
+        changed_rects.extend(draw_foods(screen, sim.foods))
+        changed_rects.append(display_text(screen, f"Score: {sim.score}", 1000, 50))
 
         if message_text:
-            display_text(screen, message_text, 200, 50)
+            changed_rects.append(display_text(screen, message_text, 200, 50))
             if time.time() - message_display_start_time > message_display_duration:
                 message_text = ""
                 message_display_duration = 2
+        timer.mark('draw')
+
+        pygame.display.update(dirty_rects + changed_rects)
+        dirty_rects = changed_rects
+        timer.mark('present')
+        clock.tick(frame_rate)
+        timer.mark('wait')
+
+    vibrations.stop()
+    timing = vibrations.timing_summary()
+    print(f"Vibrations sent: {timing['count']}, mean error {timing['mean_error']:.2f} ms, "
+          f"max error {timing['max_error']:.2f} ms")
+    timer.print_summary()
+    if timing_filename:
+        timer.write_report(timing_filename)
+        print(f"Frame timing saved to '{timing_filename}'.")
+
+def run_stress_test(foods, frames=900):
+    """Runs the game loop with `foods` foods in flight and no pacing, and
+    reports how long each frame takes against the frame_rate budget."""
+    sim = new_simulation()
+    rng = random.Random(0)
+    background = build_static_layer()
+    screen.blit(background, (0, 0))
+    pygame.display.flip()
+    dirty_rects = []
+    timer = FrameTimer(['simulate', 'draw', 'present'], target_fps=frame_rate)
+
+    for tick in range(frames):
+        timer.start_frame()
+        pygame.event.pump()
+        top_up_foods(sim, foods, rng)
+        sim.advance(time.time() * 1000)
+        timer.mark('simulate')
+
+        for rect in dirty_rects:
+            screen.blit(background, rect, rect)
+        changed_rects = [draw_hole(screen, wall_x, sim.hole_y, sim.hole_height)]
+        changed_rects.extend(draw_foods(screen, sim.foods))
+        timer.mark('draw')
+        pygame.display.update(dirty_rects + changed_rects)
+        dirty_rects = changed_rects
+        timer.mark('present')
+
+    print(f"Stress test: {frames} frames with {foods} foods in flight")
+    timer.print_summary()
+
+
+def launch(config_path=CONFIG_FILE, stress_foods=None):
+    """Entry point: loads the settings, starts the subsystems and runs the
+    experiment (or the stress test, which needs no serial connection)."""
+    load_config(config_path)
+    if not stress_foods:
+        connect_serial()  # Runs in the background while the first screens are up
+    init_display()
+    print(f"Optimal window for hole_y: {bird_y - hole_height} to {bird_y}")
+    if stress_foods:
+        run_stress_test(stress_foods)
+        pygame.quit()
+    else:
+        main()
 
-        pygame.display.flip()
-        pygame.time.Clock().tick(30)
-
-    if ser:
-        ser.close()
 
 def main():
-    global current_trial, remaining_player_shots, remaining_computer_shots
+    global current_trial
 
 
 
@@ -599,41 +625,65 @@ def main():
     subject_name = get_subject_name(screen)
     print(f"Subject Name: {subject_name}")
 
-    # Start recording force data
+    # Start recording force data; the connection was opened (and the board
+    # given time to reset) while the name was being typed
+    wait_for_serial()
     start_recording(subject_name)
-    time.sleep(2)
 
     sanitized_name = ''.join(char if char.isalnum() else '_' for char in subject_name)
 
-
-    csv_filename = f"experiment_responses_{sanitized_name}.csv"
-
-
-    if os.path.exists(csv_filename):
-
-        counter = 1
-        while os.path.exists(f"experiment_responses_{sanitized_name}_{counter}.csv"):
-            counter += 1
-        csv_filename = f"experiment_responses_{sanitized_name}_{counter}.csv"
-
-    with open(csv_filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Timestamp', 'Response', 'Intensity', 'Experiment'])
-
-        staircase_instructions = (
-            "Welcome to the Vibration Detection Experiment!\n\n"
-            "In the first part, you will undergo a Staircase Procedure to determine your vibration detection threshold.\n"
-            "A vibration will be sent at varying intensities.\n"
-            "Press any foot key (Right, Up, Left) if you detect the vibration.\n"
-            "Do NOT press any key if you do NOT detect the vibration.\n\n"
-            "Please ensure you are in a comfortable position and can clearly feel the vibrations.\n"
-            "Press any key to begin the Staircase Procedure."
-        )
-        show_instructions(screen, staircase_instructions)
-
-        threshold_intensity = run_staircase_procedure(writer)
-
-        print(f"Determined Absolute Threshold: {threshold_intensity:.2f}")
+    state = None
+    resume_path = find_resumable(sanitized_name)
+    resumable = load_checkpoint(resume_path) if resume_path else None
+    if resumable and ask_resume(resumable):
+        state = resumable
+        csv_filename = state.csv_filename
+        rows = repair_log(csv_filename)
+        if state.log_rows is not None:
+            # Rows logged after the checkpoint are played again
+            rows = truncate_log(csv_filename, state.log_rows)
+        print(f"Resuming {csv_filename} at row {rows} "
+              f"(checkpoint: row {state.log_rows}, level {state.level}, score {state.score})")
+    else:
+        if resumable:
+            abandon_checkpoint(resume_path)
+        csv_filename = f"experiment_responses_{sanitized_name}.csv"
+
+        if os.path.exists(csv_filename):
+
+            counter = 1
+            while os.path.exists(f"experiment_responses_{sanitized_name}_{counter}.csv"):
+                counter += 1
+            csv_filename = f"experiment_responses_{sanitized_name}_{counter}.csv"
+        state = SessionState(subject=subject_name, csv_filename=csv_filename, phase=PHASE_STAIRCASE)
+        open(csv_filename, mode='w').close()
+
+    checkpointer = Checkpointer(checkpoint_path(csv_filename))
+    checkpointer.submit(state)
+    checkpointer.start()
+
+    if state.threshold is None:
+        # A resumed session that crashed during the staircase runs it again
+        with AsyncCsvLogger(csv_filename, header=None if repair_log(csv_filename) else LOG_COLUMNS,
+                            mode='a') as writer:
+
+            staircase_instructions = (
+                "Welcome to the Vibration Detection Experiment!\n\n"
+                "In the first part, you will undergo a Staircase Procedure to determine your vibration detection threshold.\n"
+                "A vibration will be sent at varying intensities.\n"
+                "Press any foot key (Right, Up, Left) if you detect the vibration.\n"
+                "Do NOT press any key if you do NOT detect the vibration.\n\n"
+                "Please ensure you are in a comfortable position and can clearly feel the vibrations.\n"
+                "Press any key to begin the Staircase Procedure."
+            )
+            show_instructions(screen, staircase_instructions)
+
+            state.threshold = run_staircase_procedure(writer)
+            state.phase = PHASE_GAME
+            checkpointer.submit(state)
+
+    threshold_intensity = state.threshold
+    print(f"Determined Absolute Threshold: {threshold_intensity:.2f}")
 
     game_instructions = (
         "Game: Feed the Bird\n\n"
@@ -645,10 +695,17 @@ def main():
     )
     show_instructions(screen, game_instructions)
 
-    with open(csv_filename, mode='a', newline='') as file:
-        writer = csv.writer(file)
+    # Replay and the analyses read the frame rate and geometry from here
+    write_settings(csv_filename, new_simulation().settings())
 
-        run_game(writer, threshold_intensity)
+    # Rows are written by a background thread; leaving the block drains the queue
+    state.log_rows = repair_log(csv_filename)
+    with AsyncCsvLogger(csv_filename, mode='a') as writer:
+        run_game(writer, threshold_intensity, timing_filename=sidecar_path(csv_filename),
+                 state=state, checkpointer=checkpointer)
+    state.phase = PHASE_DONE
+    checkpointer.submit(state)
+    checkpointer.stop()
 
     screen.fill(BACKGROUND_COLOR)
     display_text(screen, f"Your responses have been saved to '{csv_filename}'.", 150, 250)
@@ -656,6 +713,7 @@ def main():
     pygame.display.flip()
 
 
+    clock = pygame.time.Clock()
     waiting = True
     while waiting:
         for event in pygame.event.get():
@@ -665,14 +723,19 @@ def main():
             elif event.type == pygame.KEYDOWN:
                 waiting = False
         pygame.display.flip()
-        pygame.time.Clock().tick(30)
-
-    if ser:
-        ser.close()
+        clock.tick(30)
 
+    stop_recording()
 
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vibration Experiment and Feed the Bird Game")
+    parser.add_argument('--stress', type=int, metavar='FOODS',
+                        help="measure frame times with FOODS foods in flight instead of running the experiment")
+    parser.add_argument('--config', default=CONFIG_FILE, help="settings file (default: bird_game.ini)")
+    args = parser.parse_args()
+    launch(args.config, stress_foods=args.stress)
\ No newline at end of file
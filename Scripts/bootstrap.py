@@ -0,0 +1,217 @@
+"""Bootstrap confidence intervals for the category response rates and IES.
+
+Resamples are drawn as batched index matrices: each row of an (r, n)
+integer matrix is one resample of the n units (subjects, or one subject's
+vibrations), and a statistic turns the whole matrix into an (r, k) array of
+estimates with a few array operations. Resamples are processed CHUNK_ELEMENTS
+indices at a time, so memory stays bounded however many are asked for.
+The jackknife needed for BCa intervals is built the same way.
+
+Two levels are available:
+
+    subject   resample subjects; the group mean rate and IES per category
+              and the mean paired differences between categories
+    trial     resample a subject's vibrations; that subject's rate and IES
+              per category and their differences
+
+Per-subject inputs come from the memoized stages of pipeline.py.
+
+Usage:
+    python bootstrap.py --data ../Data --resamples 10000
+    python bootstrap.py --level trial --method percentile --out trial_intervals.csv
+"""
+import glob
+import os
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from pipeline import CACHE_DIR, CATEGORIES, Params, categorise, metrics
+from subjects import add_arguments, map_subjects
+
+RESAMPLES = 10000
+CHUNK_ELEMENTS = 1 << 18  # resample indices held at once
+ALPHA = 0.05
+
+PAIRS = [(0, 1), (0, 2), (1, 2)]
+STAT_NAMES = ([f"Rate {category}" for category in CATEGORIES] +
+              [f"IES {category}" for category in CATEGORIES] +
+              [f"Rate {CATEGORIES[a]} - {CATEGORIES[b]}" for a, b in PAIRS] +
+              [f"IES {CATEGORIES[a]} - {CATEGORIES[b]}" for a, b in PAIRS])
+
+
+def _chunk_rows(n, chunk_elements):
+    return max(1, chunk_elements // max(n, 1))
+
+
+def bootstrap(statistic, n, resamples=RESAMPLES, seed=None, chunk_elements=CHUNK_ELEMENTS):
+    """Applies `statistic` to `resamples` resamples of n units; returns a
+    (resamples, k) array."""
+    rng = np.random.default_rng(seed)
+    rows = _chunk_rows(n, chunk_elements)
+    results = []
+    for start in range(0, resamples, rows):
+        indices = rng.integers(0, n, size=(min(rows, resamples - start), n), dtype=np.intp)
+        results.append(statistic(indices))
+    return np.concatenate(results)
+
+
+def jackknife(statistic, n, chunk_elements=CHUNK_ELEMENTS):
+    """The statistic with each unit left out in turn; an (n, k) array."""
+    rows = _chunk_rows(n - 1, chunk_elements)
+    positions = np.arange(n - 1)
+    results = []
+    for start in range(0, n, rows):
+        left_out = np.arange(start, min(start + rows, n))[:, None]
+        results.append(statistic(positions + (positions >= left_out)))
+    return np.concatenate(results)
+
+
+def percentile_intervals(boot, alpha=ALPHA):
+    """(k, 2) array of the alpha/2 and 1 - alpha/2 quantiles of each column."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=0).T
+
+
+def bca_intervals(boot, estimate, jack, alpha=ALPHA):
+    """Bias-corrected and accelerated intervals (Efron, 1987)."""
+    normal = NormalDist()
+    intervals = np.full((boot.shape[1], 2), np.nan)
+    for column in range(boot.shape[1]):
+        values = boot[:, column]
+        values = values[~np.isnan(values)]
+        leave_one_out = jack[:, column]
+        leave_one_out = leave_one_out[~np.isnan(leave_one_out)]
+        if not len(values) or np.isnan(estimate[column]) or not len(leave_one_out):
+            continue
+        # Bias: how far the bootstrap distribution sits off the estimate
+        below = np.clip(np.mean(values < estimate[column]), 1 / (len(values) + 1), len(values) / (len(values) + 1))
+        z0 = normal.inv_cdf(below)
+        # Acceleration: skewness of the jackknife values
+        deviations = leave_one_out.mean() - leave_one_out
+        spread = np.sum(deviations ** 2)
+        acceleration = np.sum(deviations ** 3) / (6 * spread ** 1.5) if spread > 0 else 0.0
+        quantiles = []
+        for tail in (alpha / 2, 1 - alpha / 2):
+            z = z0 + normal.inv_cdf(tail)
+            quantiles.append(normal.cdf(z0 + z / (1 - acceleration * z)))
+        intervals[column] = np.quantile(values, quantiles)
+    return intervals
+
+
+def confidence_intervals(statistic, n, resamples=RESAMPLES, method='bca', alpha=ALPHA, seed=None,
+                         chunk_elements=CHUNK_ELEMENTS):
+    """Point estimates and (k, 2) intervals of `statistic` over n units."""
+    estimate = statistic(np.arange(n)[None, :])[0]
+    boot = bootstrap(statistic, n, resamples, seed, chunk_elements)
+    if method == 'percentile':
+        return estimate, percentile_intervals(boot, alpha)
+    if method == 'bca':
+        return estimate, bca_intervals(boot, estimate, jackknife(statistic, n, chunk_elements), alpha)
+    raise ValueError(f"unknown interval method {method!r}, expected 'bca' or 'percentile'")
+
+
+def _nanmean_rows(values, valid):
+    """Mean over axis 1 of the valid entries; NaN where there are none."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return values.sum(axis=1) / valid.sum(axis=1)
+
+
+def subject_statistic(subject_metrics):
+    """Statistic over subjects from their pipeline metrics: group mean rate
+    and IES per category (subjects without one left out, as in all.py) and
+    the mean paired differences."""
+    rates = np.array([[m[category]['accuracy'] for category in CATEGORIES] for m in subject_metrics])
+    ies = np.array([[m[category]['ies'] for category in CATEGORIES] for m in subject_metrics])
+    columns = np.hstack([rates, ies] +
+                        [rates[:, [a]] - rates[:, [b]] for a, b in PAIRS] +
+                        [ies[:, [a]] - ies[:, [b]] for a, b in PAIRS])
+    valid = ~np.isnan(columns)
+    filled = np.where(valid, columns, 0.0)
+
+    def statistic(indices):
+        return _nanmean_rows(filled[indices], valid[indices])
+
+    return statistic
+
+
+def trial_statistic(vibrations):
+    """Statistic over the categorised vibrations of one subject: rate (%)
+    and IES per category and their differences."""
+    category = vibrations['Category'].map({name: code for code, name in enumerate(CATEGORIES)}).to_numpy()
+    correct = vibrations['CorrectResponse'].to_numpy() == 1
+    rt = np.where(correct, vibrations['RT'].to_numpy(), 0.0)
+
+    def statistic(indices):
+        resampled_category = category[indices]
+        resampled_correct = correct[indices]
+        resampled_rt = rt[indices]
+        rates, ies = [], []
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for code in range(len(CATEGORIES)):
+                in_category = resampled_category == code
+                hits = in_category & resampled_correct
+                accuracy = hits.sum(axis=1) / in_category.sum(axis=1)
+                mean_rt = (resampled_rt * hits).sum(axis=1) / hits.sum(axis=1)
+                rates.append(accuracy * 100)
+                ies.append(np.where(accuracy > 0, mean_rt / accuracy, np.nan))
+        return np.column_stack(rates + ies + [rates[a] - rates[b] for a, b in PAIRS] +
+                               [ies[a] - ies[b] for a, b in PAIRS])
+
+    return statistic
+
+
+def interval_table(estimate, intervals, **labels):
+    return pd.DataFrame({**labels, 'Statistic': STAT_NAMES, 'Estimate': estimate,
+                         'Low': intervals[:, 0], 'High': intervals[:, 1]})
+
+
+def _trial_intervals(file_path, params, cache_dir, resamples, method, alpha, seed):
+    vibrations = categorise(file_path, params, cache_dir)
+    estimate, intervals = confidence_intervals(trial_statistic(vibrations), len(vibrations), resamples,
+                                               method, alpha, seed)
+    return interval_table(estimate, intervals, Subject=os.path.basename(file_path))
+
+
+def main(argv=None):
+    import argparse
+    from functools import partial
+
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for rates, IES and their differences.")
+    parser.add_argument('--data', default='.', help="folder with the experiment_responses_*.csv logs")
+    parser.add_argument('--level', choices=['subject', 'trial'], default='subject')
+    parser.add_argument('--method', choices=['bca', 'percentile'], default='bca')
+    parser.add_argument('--resamples', type=int, default=RESAMPLES)
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prep-end', type=float, default=Params().prep_end)
+    parser.add_argument('--out', default="bootstrap_intervals.csv")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    params = Params(prep_end=args.prep_end)
+    paths = glob.glob(os.path.join(args.data, "experiment_responses_*.csv"))
+    if args.level == 'subject':
+        subjects = map_subjects(partial(metrics, params=params, cache_dir=CACHE_DIR), paths, args.jobs, args.chunksize)
+        estimate, intervals = confidence_intervals(subject_statistic([m for _, m in subjects]), len(subjects),
+                                                   args.resamples, args.method, args.alpha, args.seed)
+        table = interval_table(estimate, intervals)
+    else:
+        compute = partial(_trial_intervals, params=params, cache_dir=CACHE_DIR, resamples=args.resamples,
+                          method=args.method, alpha=args.alpha, seed=args.seed)
+        table = pd.concat([result for _, result in map_subjects(compute, paths, args.jobs, args.chunksize)],
+                          ignore_index=True)
+    table.to_csv(args.out, index=False)
+    if args.level == 'subject':
+        print(f"\n--- {100 * (1 - args.alpha):.0f}% {args.method} intervals over {len(paths)} subjects "
+              f"({args.resamples} resamples) ---")
+        for row in table.itertuples():
+            print(f"{row.Statistic:<40} {row.Estimate:9.2f}  [{row.Low:9.2f}, {row.High:9.2f}]")
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Vectorised matching of events against time windows.
+
+The analyses ask the same questions of every vibration: was there a foot
+press within the response window after it (and how long after), did it fall
+in the preparation window of a shot, and was it close to an optimal moment.
+Checking each vibration against every press or shot costs O(V*F) per
+subject. Here the other events' timestamps are sorted once and every
+vibration is located among them with `np.searchsorted`, which is
+O((V + F) log F).
+
+Window bounds are inclusive unless noted, exactly like the comparisons the
+scripts used to make per vibration.
+"""
+import numpy as np
+
+
+def _sorted(times):
+    return np.sort(np.asarray(times, dtype=float))
+
+
+def first_responses(event_times, response_times, max_latency):
+    """For each event, the first response at or after it and no more than
+    `max_latency` later. Returns (responded, rt): an int array of 0/1 and
+    the response times (NaN where there was none)."""
+    events = np.asarray(event_times, dtype=float)
+    responses = _sorted(response_times)
+    if not len(responses):
+        return np.zeros(len(events), dtype=int), np.full(len(events), np.nan)
+    first = np.searchsorted(responses, events, side='left')
+    candidate = responses[np.minimum(first, len(responses) - 1)]
+    responded = (first < len(responses)) & (candidate <= events + max_latency)
+    return responded.astype(int), np.where(responded, candidate - events, np.nan)
+
+
+def in_windows(event_times, anchor_times, start, end):
+    """Whether each event lies in [anchor + start, anchor + end] of any anchor."""
+    events = np.asarray(event_times, dtype=float)
+    anchors = _sorted(anchor_times)
+    # anchor + start <= t <= anchor + end  <=>  t - end <= anchor <= t - start
+    return np.searchsorted(anchors, events - end, side='left') < np.searchsorted(anchors, events - start, side='right')
+
+
+def near_any(event_times, anchor_times, tolerance):
+    """Whether each event is strictly closer than `tolerance` to any anchor."""
+    events = np.asarray(event_times, dtype=float)
+    anchors = _sorted(anchor_times)
+    return np.searchsorted(anchors, events - tolerance, side='right') < np.searchsorted(anchors, events + tolerance, side='left')
+
+
+def pairs_in_windows(event_times, anchor_times, start, end):
+    """Every (event, anchor) pair with start <= event - anchor <= end.
+
+    Returns (event_indices, offsets): the index of the event in
+    `event_times` and event - anchor for each pair, grouped by event and in
+    anchor time order within an event. Only the pairs are touched, so the
+    cost is O(E log A + pairs) rather than O(E*A).
+    """
+    events = np.asarray(event_times, dtype=float)
+    anchors = _sorted(anchor_times)
+    first = np.searchsorted(anchors, events - end, side='left')
+    last = np.searchsorted(anchors, events - start, side='right')
+    counts = last - first
+    event_indices = np.repeat(np.arange(len(events)), counts)
+    # Position of each pair within its event's run of anchors
+    runs = np.arange(len(event_indices)) - np.repeat(np.cumsum(counts) - counts, counts)
+    anchor_indices = np.repeat(first, counts) + runs
+    return event_indices, events[event_indices] - anchors[anchor_indices]
+
+
+def group_means(times, gap):
+    """Splits sorted `times` wherever consecutive ones are more than `gap`
+    apart and returns the mean of each group.
+
+    Groups of equal length are averaged together as the rows of one 2-D
+    array, which sums each row in the same order as `np.mean` on the group
+    alone, so the means are bit-for-bit those of a per-group loop.
+    """
+    times = np.asarray(times, dtype=float)
+    if not len(times):
+        return np.empty(0)
+    starts = np.r_[0, np.flatnonzero(np.diff(times) > gap) + 1]
+    lengths = np.diff(np.r_[starts, len(times)])
+    means = np.empty(len(starts))
+    for length in np.unique(lengths):
+        groups = np.flatnonzero(lengths == length)
+        means[groups] = times[starts[groups, None] + np.arange(length)].mean(axis=1)
+    return means
+
+
+def vibration_windows(vibration_times, foot_times, shoot_times, optimal_times,
+                      response_threshold, prep_start, prep_end, optimal_tolerance):
+    """Everything the analyses need to know about each vibration, as columns:
+    CorrectResponse (0/1), RT (ms, NaN without a response), InPrepWindow
+    and InOptimalMoment."""
+    correct, rt = first_responses(vibration_times, foot_times, response_threshold)
+    return {
+        'CorrectResponse': correct,
+        'RT': rt,
+        'InPrepWindow': in_windows(vibration_times, shoot_times, prep_start, prep_end),
+        'InOptimalMoment': near_any(vibration_times, optimal_times, optimal_tolerance),
+    }
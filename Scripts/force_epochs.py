@@ -0,0 +1,224 @@
+"""Force-sensor epochs around game events.
+
+Each subject's force recording is cut into fixed-length epochs around their
+PlayerShoot, VibrationSent and FootPedalPress rows and interpolated onto a
+common grid of offsets (EPOCH_START..EPOCH_END ms in SAMPLE_STEP steps), so
+all subjects and events can be averaged sample by sample. Both files are
+stamped with time.time() in ms, so no alignment beyond the timestamps is
+needed.
+
+Recordings are never read whole. An old force_data_*.csv is first
+streamed in chunks into a binary .force file (see force_reader.py) in the
+ingest cache. Events are located with a two-level index: every
+INDEX_STRIDE-th timestamp is held in memory, and only the samples around
+an event's epoch are read from the file. Samples are
+assumed to be in arrival order, as the recorder writes them. Grid points
+with no sample within MAX_GAP ms on either side, or outside the recording,
+are NaN.
+
+The result for each event type is a (subject x event x sample) float32
+array, padded with NaN for subjects with fewer events.
+
+Usage:
+    python force_epochs.py --data ../Data --out force_epochs.npz
+    python force_epochs.py --start -1000 --end 500 --step 2 --events PlayerShoot
+"""
+import glob
+import os
+import re
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from responses import load_responses, cache_path, PLAYER_SHOOT, VIBRATION_SENT, FOOT_PEDAL_PRESS
+from force_reader import HEADER_SIZE, RECORD_DTYPE, make_header, read_header
+from subjects import add_arguments, map_subjects, subject_sort_key
+
+EPOCH_START = -500   # ms relative to the event
+EPOCH_END = 1000
+SAMPLE_STEP = 5      # ms between grid points
+MAX_GAP = 50         # ms without samples that is not interpolated across
+INDEX_STRIDE = 4096  # samples per block of the in-memory index
+CSV_CHUNK = 1 << 18  # rows per read when converting a CSV recording
+
+EVENTS = {
+    'PlayerShoot': PLAYER_SHOOT,
+    'VibrationSent': VIBRATION_SENT,
+    'FootPedalPress': FOOT_PEDAL_PRESS,
+}
+
+
+def epoch_grid(start=EPOCH_START, end=EPOCH_END, step=SAMPLE_STEP):
+    return np.arange(start, end + step / 2, step, dtype=float)
+
+
+def force_path(responses_path):
+    """The force recording of a response log (same subject suffix), or None."""
+    folder, name = os.path.split(responses_path)
+    suffix = re.fullmatch(r"experiment_responses_(.*)\.csv", name).group(1)
+    for extension in ('.force', '.csv'):
+        path = os.path.join(folder, f"force_data_{suffix}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def binary_force_file(path):
+    """The .force file of a recording. A CSV recording is converted once
+    into the ingest cache, a chunk at a time."""
+    if not path.endswith('.csv'):
+        return path
+    converted = os.path.splitext(cache_path(path))[0] + '.force'
+    if not os.path.exists(converted) or os.path.getmtime(converted) < os.path.getmtime(path):
+        os.makedirs(os.path.dirname(converted), exist_ok=True)
+        with open(converted + '.tmp', 'wb') as file:
+            file.write(make_header(os.path.getmtime(path)))
+            for chunk in pd.read_csv(path, chunksize=CSV_CHUNK, usecols=['Timestamp', 'Force']):
+                chunk = chunk.apply(pd.to_numeric, errors='coerce').dropna()
+                records = np.empty(len(chunk), dtype=RECORD_DTYPE)
+                records['timestamp'] = chunk['Timestamp'].to_numpy()
+                records['force'] = chunk['Force'].to_numpy()
+                file.write(records.tobytes())
+        os.replace(converted + '.tmp', converted)
+    return converted
+
+
+class ForceIndex:
+    """Reads samples of a .force file by position and finds them by time,
+    holding only every `stride`-th timestamp in memory.
+
+    Samples are fetched with a seek and a read rather than through a memory
+    map: epochs spread over a long recording would otherwise leave most of
+    its pages resident. Not safe to share between threads.
+    """
+
+    def __init__(self, filename, stride=INDEX_STRIDE):
+        self.file = open(filename, 'rb')
+        read_header(self.file)
+        self.count = (os.path.getsize(filename) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self.stride = stride
+        stamps = [self._read_at(position, 8) for position in range(0, self.count, stride)]
+        self.coarse = np.frombuffer(b''.join(stamps), dtype='<f8')
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.file.close()
+
+    def read(self, start, stop):
+        """Records start..stop-1 as a structured array."""
+        stop = min(stop, self.count)
+        return np.frombuffer(self._read_at(start, (stop - start) * RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)
+
+    def _read_at(self, position, size):
+        """`size` bytes from the start of record `position`."""
+        self.file.seek(HEADER_SIZE + position * RECORD_DTYPE.itemsize)
+        return self.file.read(size)
+
+    def searchsorted(self, times):
+        """Position of the first sample at or after each time."""
+        times = np.asarray(times, dtype=float)
+        # The block whose first timestamp is the last one before each time
+        blocks = np.maximum(np.searchsorted(self.coarse, times, side='left') - 1, 0)
+        positions = np.empty(len(times), dtype=np.intp)
+        for block in np.unique(blocks):
+            start = block * self.stride
+            chunk = self.read(start, start + self.stride)['timestamp']
+            selected = blocks == block
+            positions[selected] = start + np.searchsorted(chunk, times[selected], side='left')
+        return positions
+
+
+def extract_epochs(index, event_times, grid, max_gap=MAX_GAP):
+    """(event x sample) force values at event + grid, linearly interpolated."""
+    epochs = np.full((len(event_times), len(grid)), np.nan, dtype=np.float32)
+    if not len(index) or not len(event_times):
+        return epochs
+    # Sample range of each epoch: from the last sample before its start to
+    # the first one after its end, which may coincide with the end
+    first = np.maximum(index.searchsorted(event_times + grid[0]) - 1, 0)
+    last = np.minimum(index.searchsorted(event_times + grid[-1]) + 2, len(index))
+    for row, (event, lo, hi) in enumerate(zip(event_times, first, last)):
+        if hi - lo < 2:
+            continue
+        samples = index.read(lo, hi)
+        times, values = samples['timestamp'], samples['force']
+        targets = event + grid
+        right = np.searchsorted(times, targets, side='right')
+        inside = (right > 0) & (right < len(times))
+        right = np.where(inside, right, 1)
+        t0, t1 = times[right - 1], times[right]
+        v0, v1 = values[right - 1], values[right]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            interpolated = v0 + (targets - t0) / (t1 - t0) * (v1 - v0)
+        epochs[row] = np.where(inside & (t1 - t0 <= max_gap), interpolated, np.nan)
+    return epochs
+
+
+def subject_epochs(responses_path, events=tuple(EVENTS), grid=None, max_gap=MAX_GAP):
+    """{event: (event times, epochs)} of one subject, or None without a recording."""
+    path = force_path(responses_path)
+    if path is None:
+        return None
+    grid = epoch_grid() if grid is None else grid
+    df = load_responses(responses_path)
+    index = ForceIndex(binary_force_file(path))
+    result = {}
+    for event in events:
+        times = np.sort(df.loc[df['EventCode'] == EVENTS[event], 'Timestamp'].to_numpy())
+        result[event] = (times, extract_epochs(index, times, grid, max_gap))
+    index.close()
+    return result
+
+
+def cohort_epochs(paths, events=tuple(EVENTS), grid=None, max_gap=MAX_GAP, jobs=None, chunksize=1):
+    """Epochs of every subject with a force recording, stacked per event into
+    (subject x event x sample) arrays. Returns (subjects, grid, epochs,
+    event_times), with epochs and event_times keyed by event name."""
+    grid = epoch_grid() if grid is None else grid
+    results = [(path, result) for path, result in
+               map_subjects(partial(subject_epochs, events=events, grid=grid, max_gap=max_gap), paths, jobs, chunksize)
+               if result is not None]
+    subjects = [os.path.basename(path) for path, _ in results]
+    epochs, event_times = {}, {}
+    for event in events:
+        count = max((len(result[event][0]) for _, result in results), default=0)
+        epochs[event] = np.full((len(results), count, len(grid)), np.nan, dtype=np.float32)
+        event_times[event] = np.full((len(results), count), np.nan)
+        for row, (_, result) in enumerate(results):
+            times, subject = result[event]
+            epochs[event][row, :len(times)] = subject
+            event_times[event][row, :len(times)] = times
+    return subjects, grid, epochs, event_times
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cut force recordings into epochs around game events.")
+    parser.add_argument('--data', default='.', help="folder with the response logs and force recordings")
+    parser.add_argument('--events', nargs='+', choices=list(EVENTS), default=list(EVENTS))
+    parser.add_argument('--start', type=float, default=EPOCH_START, help="epoch start relative to the event (ms)")
+    parser.add_argument('--end', type=float, default=EPOCH_END, help="epoch end relative to the event (ms)")
+    parser.add_argument('--step', type=float, default=SAMPLE_STEP, help="grid spacing (ms)")
+    parser.add_argument('--max-gap', type=float, default=MAX_GAP)
+    parser.add_argument('--out', default="force_epochs.npz")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.data, "experiment_responses_*.csv")), key=subject_sort_key)
+    subjects, grid, epochs, event_times = cohort_epochs(paths, tuple(args.events), epoch_grid(args.start, args.end, args.step),
+                                                        args.max_gap, args.jobs, args.chunksize)
+    np.savez(args.out, subjects=np.array(subjects), grid=grid,
+             **{f"{event}_epochs": epochs[event] for event in args.events},
+             **{f"{event}_times": event_times[event] for event in args.events})
+    print(f"{len(subjects)} of {len(paths)} subjects have a force recording")
+    for event in args.events:
+        print(f"{event}: {epochs[event].shape} (subject x event x sample)")
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,77 +4,21 @@ import matplotlib.pyplot as plt
 import glob
 from scipy.stats import ttest_rel
 from statsmodels.stats.anova import AnovaRM
+from pipeline import Params, categorise_vibrations, load_subject as load_and_filter_data
+from subjects import add_arguments, map_subjects
 
 # Constants
 RESPONSE_THRESHOLD = 1000  # in ms
 SHOOT_WINDOW = 30
 PREP_WINDOW_START = -120
 PREP_WINDOW_END = 0
+MOMENT_GAP = 100
 
-def group_noshot_events(df):
-    noshot_df = df[df['Experiment'].str.startswith("OptimalMoment", na=False)].copy()
-    groups = []
-    current_group = []
-    prev_time = None
-    for _, row in noshot_df.iterrows():
-        if prev_time is not None and row['Timestamp'] - prev_time > 100:
-            groups.append(current_group)
-            current_group = []
-        current_group.append(row['Timestamp'])
-        prev_time = row['Timestamp']
-    if current_group:
-        groups.append(current_group)
-    return [np.mean(group) for group in groups]
-
-def load_and_filter_data(file_path):
-    df = pd.read_csv(file_path, header=0, usecols=[0, 1, 2, 3])
-    df = df[df['Experiment'].notna()]
-    df = df[~df['Experiment'].str.contains("Staircase Procedure", na=False)]
-    df['Timestamp'] = pd.to_numeric(df['Timestamp'])
-    df['Response'] = df['Response'].astype(str).str.strip()
-    return df
-
-def is_in_prep_window(vibration_time, shoot_times):
-    return np.any((shoot_times + PREP_WINDOW_START <= vibration_time) &
-                  (vibration_time <= shoot_times + PREP_WINDOW_END))
+PARAMS = Params(response_threshold=RESPONSE_THRESHOLD, shoot_window=SHOOT_WINDOW, prep_start=PREP_WINDOW_START,
+                prep_end=PREP_WINDOW_END, moment_gap=MOMENT_GAP)
 
 def process_subject(file_path):
-    df = load_and_filter_data(file_path)
-    vibrations = df[df['Experiment'].str.startswith("VibrationSent", na=False)].copy()
-    player_shoots = df[df['Experiment'].str.startswith("PlayerShoot", na=False)].copy()
-    foot_df = df[df['Experiment'].str.startswith("FootPedalPress", na=False)].copy()
-
-    shoot_times = player_shoots['Timestamp'].values
-    foot_times = foot_df['Timestamp'].values
-
-    optimal_moments = group_noshot_events(df)
-    valid_optimal_moments = [
-        om_time for om_time in optimal_moments
-        if not np.any((player_shoots['Timestamp'] >= om_time - SHOOT_WINDOW) &
-                      (player_shoots['Timestamp'] <= om_time + SHOOT_WINDOW))
-    ]
-    valid_optimal_moments = np.array(valid_optimal_moments)
-
-    vibrations['CorrectResponse'] = 0
-    vibrations['RT'] = np.nan
-
-    for idx, row in vibrations.iterrows():
-        vib_time = row['Timestamp']
-        valid_press = foot_df[(foot_df['Timestamp'] >= vib_time) &
-                              (foot_df['Timestamp'] <= vib_time + RESPONSE_THRESHOLD)]
-        if not valid_press.empty:
-            rt = valid_press.iloc[0]['Timestamp'] - vib_time
-            vibrations.at[idx, 'CorrectResponse'] = 1
-            vibrations.at[idx, 'RT'] = rt
-
-    vibrations['InOptimalMoment'] = vibrations['Timestamp'].apply(
-        lambda t: np.any(np.abs(valid_optimal_moments - t) < SHOOT_WINDOW))
-    vibrations['InPrepWindow'] = vibrations['Timestamp'].apply(
-        lambda t: is_in_prep_window(t, shoot_times))
-
-    vibrations['Category'] = "Outside Window"
-    vibrations.loc[vibrations['InPrepWindow'], 'Category'] = "Prep Window"
-    vibrations.loc[vibrations['InOptimalMoment'], 'Category'] = "Optimal Moment"
+    vibrations = categorise_vibrations(load_and_filter_data(file_path), PARAMS)
 
     results = {}
     for category in ["Optimal Moment", "Prep Window", "Outside Window"]:
@@ -98,7 +42,7 @@ def compute_cohens_d(x, y):
     diff = x - y
     return np.mean(diff) / np.std(diff, ddof=1)
 
-def main():
+def main(jobs=None, chunksize=1):
     all_files = glob.glob("experiment_responses_*.csv")
     categories = ["Optimal Moment", "Prep Window", "Outside Window"]
 
@@ -106,8 +50,7 @@ def main():
     ies_data = {cat: [] for cat in categories}
     valid_subject_indices = []
 
-    for idx, file in enumerate(all_files):
-        res = process_subject(file)
+    for idx, (file, res) in enumerate(map_subjects(process_subject, all_files, jobs, chunksize)):
         if all(not np.isnan(res[cat]['ies']) for cat in categories):
             valid_subject_indices.append(idx)
             for cat in categories:
@@ -161,4 +104,9 @@ def main():
         print(f"{cat1} vs {cat2}: t = {t_stat:.3f}, p = {p_val:.5f}, d = {d:.2f} {sig}")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inverse efficiency scores per window category with RM-ANOVA and paired t-tests.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    main(args.jobs, args.chunksize)
@@ -0,0 +1,387 @@
+"""One pipeline for the analyses of the Scripts/ folder.
+
+The analyses share their stages; each one depends on those above it:
+
+    load        a subject's log, OptimalMoment rows expanded, staircase dropped
+    categorise  every vibration of a subject: response, RT and window category
+    metrics     per subject and category: count, accuracy, SEM, mean RT, IES
+    bins        per subject: correct response rate in time bins around the shots
+    group       group averages and statistics of one analysis
+    figures     the plot of one analysis
+
+Stage results are memoized as pickles in CACHE_DIR, keyed on the stage, the
+parameters it uses and the size and mtime of the logs it reads (the load
+stage is memoized by the ingest cache of responses.py). So asking for the
+IES after the accuracy reuses the categorised vibrations, adding a
+participant computes only their stages plus the group, and changing a
+window parameter recomputes only what depends on it. scipy, statsmodels and
+matplotlib are imported only by the stages that use them.
+
+The preparation window is -120..-50 ms before a shot for every analysis;
+iesstat.py used -120..0, which `--prep-end 0` reproduces.
+
+Usage:
+    python pipeline.py accuracy ies --data ../Data --jobs 4
+    python pipeline.py bins --figures plots
+    python pipeline.py ies --prep-end 0
+"""
+import glob
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from event_windows import first_responses, group_means, in_windows, pairs_in_windows, vibration_windows
+from responses import load_responses, settings_path, STAIRCASE, VIBRATION_SENT, PLAYER_SHOOT, FOOT_PEDAL_PRESS, OPTIMAL_MOMENT
+from subjects import add_arguments, map_subjects
+
+CACHE_DIR = '.pipeline_cache'
+STAGE_VERSION = 3  # bump when a stage's computation changes
+
+CATEGORIES = ["Optimal Moment", "Prep Window", "Outside Window"]
+
+Params = namedtuple('Params', [
+    'response_threshold',  # ms after a vibration in which a foot press counts as a response
+    'shoot_window',        # ms around an optimal moment that must be free of shots
+    'prep_start',          # preparation window relative to a shot (ms)
+    'prep_end',
+    'moment_gap',          # ms between OptimalMoment rows that starts a new moment
+    'bin_size',            # width of the peri-shot bins (ms)
+    'time_range',          # peri-shot bins cover +-time_range ms
+])
+Params.__new__.__defaults__ = (1000, 30, -120, -50, 100, 50, 500)
+
+# The parameters each stage depends on, and so is keyed on
+CATEGORISE_PARAMS = ('response_threshold', 'shoot_window', 'prep_start', 'prep_end', 'moment_gap')
+BINS_PARAMS = ('response_threshold', 'bin_size', 'time_range')
+
+
+def memoized(cache_dir, stage, key, compute):
+    """Returns the stored result of `stage` for `key`, computing and storing
+    it first if there is none. `cache_dir=None` turns memoization off."""
+    if cache_dir is None:
+        return compute()
+    digest = hashlib.sha1(repr((STAGE_VERSION, stage, key)).encode()).hexdigest()[:20]
+    path = os.path.join(cache_dir, f"{stage}-{digest}.pkl")
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    result = compute()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+    return result
+
+
+def fingerprint(file_path):
+    """The log plus the settings file its optimal windows are sized from."""
+    stat = os.stat(file_path)
+    try:
+        settings = os.stat(settings_path(file_path))
+        settings = settings.st_size, settings.st_mtime_ns
+    except FileNotFoundError:
+        settings = None
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, settings
+
+
+def stage_params(params, names):
+    return tuple((name, float(getattr(params, name))) for name in names)
+
+
+# ---------------------------------------------------------------------------
+# Per-subject computations
+# ---------------------------------------------------------------------------
+
+def load_subject(file_path):
+    """The load stage: a log with OptimalMoment rows and without the staircase."""
+    df = load_responses(file_path, expand_windows=True)
+    return df[df['EventCode'] != STAIRCASE]
+
+
+def group_noshot_events(df, gap=Params().moment_gap):
+    """Mean time of each run of OptimalMoment rows no more than `gap` ms apart."""
+    return group_means(df.loc[df['EventCode'] == OPTIMAL_MOMENT, 'Timestamp'].to_numpy(), gap)
+
+
+def categorise_vibrations(df, params=Params()):
+    """The vibrations of a loaded log with CorrectResponse, RT, InPrepWindow,
+    InOptimalMoment and Category columns."""
+    vibrations = df[df['EventCode'] == VIBRATION_SENT]
+    shoot_times = df.loc[df['EventCode'] == PLAYER_SHOOT, 'Timestamp'].values
+    foot_times = df.loc[df['EventCode'] == FOOT_PEDAL_PRESS, 'Timestamp'].values
+
+    optimal_moments = group_noshot_events(df, params.moment_gap)
+    valid_optimal_moments = optimal_moments[~in_windows(optimal_moments, shoot_times,
+                                                        -params.shoot_window, params.shoot_window)]
+
+    vibrations = vibrations.assign(**vibration_windows(
+        vibrations['Timestamp'].values, foot_times, shoot_times, valid_optimal_moments,
+        params.response_threshold, params.prep_start, params.prep_end, params.shoot_window))
+
+    vibrations['Category'] = "Outside Window"
+    vibrations.loc[vibrations['InPrepWindow'], 'Category'] = "Prep Window"
+    vibrations.loc[vibrations['InOptimalMoment'], 'Category'] = "Optimal Moment"
+    return vibrations
+
+
+def category_metrics(vibrations):
+    """Per category: total and correct vibrations, accuracy (%), its SEM,
+    mean RT of the correct ones and the inverse efficiency score."""
+    metrics = {}
+    for category in CATEGORIES:
+        subset = vibrations[vibrations['Category'] == category]
+        total = len(subset)
+        correct_subset = subset[subset['CorrectResponse'] == 1]
+        correct = len(correct_subset)
+        accuracy = correct / total if total > 0 else np.nan
+        mean_rt = correct_subset['RT'].mean() if correct > 0 else np.nan
+        metrics[category] = {
+            'total': total,
+            'correct': correct,
+            'accuracy': accuracy * 100,
+            'sem': np.sqrt(accuracy * (1 - accuracy) / total) * 100 if total > 0 else np.nan,
+            'mean_rt': mean_rt,
+            'ies': mean_rt / accuracy if accuracy > 0 else np.nan,
+        }
+    return metrics
+
+
+def peri_shot_bins(df, params=Params()):
+    """Correct response rates (%) and vibration counts per bin of the
+    vibration's time relative to every shot within time_range."""
+    bin_edges = np.arange(-params.time_range, params.time_range + params.bin_size, params.bin_size)
+    num_bins = len(bin_edges) - 1
+    vibration_times = df.loc[df['EventCode'] == VIBRATION_SENT, 'Timestamp'].values
+    foot_times = df.loc[df['EventCode'] == FOOT_PEDAL_PRESS, 'Timestamp'].values
+    shoot_times = df.loc[df['EventCode'] == PLAYER_SHOOT, 'Timestamp'].values
+    correct, _ = first_responses(vibration_times, foot_times, params.response_threshold)
+
+    vib_idx, diffs = pairs_in_windows(vibration_times, shoot_times, -params.time_range, params.time_range)
+    bin_idx = np.digitize(diffs, bin_edges) - 1
+    in_range = (bin_idx >= 0) & (bin_idx < num_bins)
+    bin_idx = bin_idx[in_range]
+    totals = np.bincount(bin_idx, minlength=num_bins).astype(float)
+    corrects = np.bincount(bin_idx, weights=correct[vib_idx[in_range]], minlength=num_bins)
+    rates = np.divide(corrects, totals, out=np.zeros(num_bins), where=totals != 0) * 100
+    return rates, totals
+
+
+# ---------------------------------------------------------------------------
+# Memoized stages
+# ---------------------------------------------------------------------------
+
+def categorise(file_path, params=Params(), cache_dir=CACHE_DIR):
+    return memoized(cache_dir, 'categorise', (fingerprint(file_path), stage_params(params, CATEGORISE_PARAMS)),
+                    lambda: categorise_vibrations(load_subject(file_path), params))
+
+
+def metrics(file_path, params=Params(), cache_dir=CACHE_DIR):
+    return memoized(cache_dir, 'metrics', (fingerprint(file_path), stage_params(params, CATEGORISE_PARAMS)),
+                    lambda: category_metrics(categorise(file_path, params, cache_dir)))
+
+
+def bins(file_path, params=Params(), cache_dir=CACHE_DIR):
+    return memoized(cache_dir, 'bins', (fingerprint(file_path), stage_params(params, BINS_PARAMS)),
+                    lambda: peri_shot_bins(load_subject(file_path), params))
+
+
+def _sem(values):
+    return np.std(values, ddof=1) / np.sqrt(len(values))
+
+
+def _cohens_d(x, y):
+    diff = np.asarray(x) - np.asarray(y)
+    return np.mean(diff) / np.std(diff, ddof=1)
+
+
+def accuracy_stats(subjects):
+    """Mean and SEM over subjects of each category's correct response rate."""
+    rates = {category: [m[category]['accuracy'] for _, m in subjects if not np.isnan(m[category]['accuracy'])]
+             for category in CATEGORIES}
+    return {
+        'n': len(subjects),
+        'mean': {category: np.mean(rates[category]) for category in CATEGORIES},
+        'sem': {category: _sem(rates[category]) for category in CATEGORIES},
+    }
+
+
+def ies_stats(subjects):
+    """IES means with RM-ANOVA and paired t-tests over the subjects with an
+    IES in every category."""
+    from scipy.stats import ttest_rel
+    from statsmodels.stats.anova import AnovaRM
+
+    skipped = [path for path, m in subjects if any(np.isnan(m[category]['ies']) for category in CATEGORIES)]
+    valid = [m for path, m in subjects if path not in skipped]
+    ies = {category: np.array([m[category]['ies'] for m in valid]) for category in CATEGORIES}
+
+    long_data = pd.DataFrame([{'Subject': i, 'Condition': category, 'IES': ies[category][i]}
+                              for i in range(len(valid)) for category in CATEGORIES])
+    anova = AnovaRM(long_data, depvar='IES', subject='Subject', within=['Condition']).fit()
+
+    ttests = []
+    for first, second in [(CATEGORIES[0], CATEGORIES[1]), (CATEGORIES[0], CATEGORIES[2]),
+                          (CATEGORIES[1], CATEGORIES[2])]:
+        t_stat, p_val = ttest_rel(ies[first], ies[second])
+        ttests.append({'pair': (first, second), 't': t_stat, 'p': p_val, 'd': _cohens_d(ies[first], ies[second])})
+    return {
+        'n': len(valid),
+        'skipped': skipped,
+        'mean': {category: np.mean(ies[category]) for category in CATEGORIES},
+        'sem': {category: _sem(ies[category]) for category in CATEGORIES},
+        'anova': anova.anova_table,
+        'ttests': ttests,
+    }
+
+
+def bins_stats(subjects, params):
+    """Mean rate per bin, one-way ANOVA across bins and the preparation
+    window bins against the rest."""
+    import scipy.stats as stats
+
+    rates = np.array([subject_rates for _, (subject_rates, _) in subjects])
+    counts = np.array([subject_counts for _, (_, subject_counts) in subjects])
+    bin_edges = np.arange(-params.time_range, params.time_range + params.bin_size, params.bin_size)
+    prep = np.flatnonzero((bin_edges[:-1] >= params.prep_start) & (bin_edges[:-1] < params.prep_end))
+    outside = np.setdiff1d(np.arange(len(bin_edges) - 1), prep)
+
+    f_val, p_val = stats.f_oneway(*rates.T)
+    prep_means = rates[:, prep].mean(axis=1)
+    outside_means = rates[:, outside].mean(axis=1)
+    t_val, p_ttest = stats.ttest_rel(prep_means, outside_means)
+    return {
+        'n': len(subjects),
+        'bin_edges': bin_edges,
+        'prep_bins': prep,
+        'mean': rates.mean(axis=0),
+        'sem': np.std(rates, axis=0, ddof=1) / np.sqrt(len(rates)),
+        'mean_counts': counts.mean(axis=0).astype(int),
+        'anova_f': f_val,
+        'anova_p': p_val,
+        't': t_val,
+        't_p': p_ttest,
+        'cohens_d': _cohens_d(prep_means, outside_means),
+    }
+
+
+# analysis -> (per-subject stage, stage parameters, group statistics)
+ANALYSES = {
+    'accuracy': (metrics, CATEGORISE_PARAMS, lambda subjects, params: accuracy_stats(subjects)),
+    'ies': (metrics, CATEGORISE_PARAMS, lambda subjects, params: ies_stats(subjects)),
+    'bins': (bins, BINS_PARAMS + ('prep_start', 'prep_end'), bins_stats),
+}
+
+
+def group(analysis, paths, params=Params(), cache_dir=CACHE_DIR, jobs=None, chunksize=1):
+    """The group stage of `analysis` over the logs in `paths`."""
+    subject_stage, names, statistics = ANALYSES[analysis]
+    key = (sorted(map(fingerprint, paths)), stage_params(params, names))
+
+    def compute():
+        subjects = map_subjects(partial(subject_stage, params=params, cache_dir=cache_dir), paths, jobs, chunksize)
+        return statistics(subjects, params)
+
+    return memoized(cache_dir, 'group-' + analysis, key, compute)
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def print_report(analysis, result):
+    if analysis == 'accuracy':
+        print("\n--- Group-Level Correct Response Rate (Mean ± SEM) ---")
+        for category in CATEGORIES:
+            print(f"{category}: {result['mean'][category]:.2f}% ± {result['sem'][category]:.2f}")
+    elif analysis == 'ies':
+        for path in result['skipped']:
+            print(f"⚠️ Skipped {path}: NaN IES found in one or more conditions")
+        print(f"\n--- Group-Level IES (Mean ± SEM, n={result['n']}) ---")
+        for category in CATEGORIES:
+            print(f"{category}: {result['mean'][category]:.1f} ms ± {result['sem'][category]:.1f}")
+        print("\n--- Repeated-Measures ANOVA on IES ---")
+        print(result['anova'])
+        print("\n--- Paired t-tests on IES ---")
+        for test in result['ttests']:
+            p_val = test['p']
+            sig = "***" if p_val < 0.001 else "**" if p_val < 0.01 else "*" if p_val < 0.05 else ""
+            print(f"{test['pair'][0]} vs {test['pair'][1]}: t = {test['t']:.3f}, p = {p_val:.5f}, "
+                  f"d = {test['d']:.2f} {sig}")
+    elif analysis == 'bins':
+        print(f"\n--- Correct Response Rate Around PlayerShoot (n={result['n']}) ---")
+        for start, rate, sem, count in zip(result['bin_edges'], result['mean'], result['sem'],
+                                           result['mean_counts']):
+            print(f"{start:5.0f} ms: {rate:6.2f}% ± {sem:.2f} ({count} vibrations)")
+        print(f"ANOVA across bins: F = {result['anova_f']:.2f}, p = {result['anova_p']:.5f}")
+        print(f"Preparation window vs outside: t = {result['t']:.2f}, p = {result['t_p']:.5f}, "
+              f"d = {result['cohens_d']:.2f}")
+
+
+def save_figure(analysis, result, params, out_dir):
+    """The figures stage: writes <analysis>.png to out_dir and returns its path."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6) if analysis == 'bins' else (8, 6))
+    if analysis == 'bins':
+        x_vals = result['bin_edges'][:-1] + params.bin_size / 2
+        plt.errorbar(x_vals, result['mean'], yerr=result['sem'], fmt='o', color='blue',
+                     ecolor='black', capsize=5, label='Mean Correct Response Rate')
+        plt.axvspan(params.prep_start, params.prep_end, color='gray', alpha=0.3, label='Preparation Window')
+        plt.axvline(0, color='red', linestyle='--', label='PlayerShoot')
+        plt.xlabel("Time from PlayerShoot (ms)")
+        plt.ylabel("Correct Response Rate (%)")
+        plt.ylim(0, 100)
+        plt.legend()
+    else:
+        means = [result['mean'][category] for category in CATEGORIES]
+        sems = [result['sem'][category] for category in CATEGORIES]
+        plt.bar(CATEGORIES, means, yerr=sems, capsize=5, color=["skyblue", "lightgreen", "salmon"], alpha=0.7)
+        plt.ylabel("Correct Response Rate (%)" if analysis == 'accuracy' else "Inverse Efficiency Score (ms)")
+    plt.title(f"{analysis} (n={result['n']})")
+    plt.tight_layout()
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{analysis}.png")
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Feed the Bird analyses with memoized stages.")
+    parser.add_argument('analyses', nargs='+', choices=sorted(ANALYSES))
+    parser.add_argument('--data', default='.', help="folder with the experiment_responses_*.csv logs")
+    parser.add_argument('--figures', metavar='DIR', help="also write a plot of each analysis to DIR")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="where stage results are kept")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every stage")
+    defaults = Params()
+    for name in Params._fields:
+        parser.add_argument('--' + name.replace('_', '-'), type=float, default=getattr(defaults, name))
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    params = Params(**{name: getattr(args, name) for name in Params._fields})
+    paths = glob.glob(os.path.join(args.data, "experiment_responses_*.csv"))
+    cache_dir = None if args.no_cache else args.cache_dir
+    for analysis in args.analyses:
+        result = group(analysis, paths, params, cache_dir, args.jobs, args.chunksize)
+        print_report(analysis, result)
+        if args.figures:
+            print(f"Wrote {save_figure(analysis, result, params, args.figures)}")
+
+
+if __name__ == "__main__":
+    main()
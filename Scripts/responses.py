@@ -0,0 +1,291 @@
+"""Loads experiment_responses logs as typed DataFrames.
+
+Every schema version is accepted (see log_schema.py next to Bird_Game.py):
+version 1 logs are upgraded row by row while reading, later versions are a
+plain column read. Either way the result has the current columns, with
+events selected by `EventCode` instead of string matching.
+
+Newer logs keep only the edges of each optimal window; pass
+`expand_windows=True` to get the per-frame OptimalMoment rows back.
+
+Parsed logs are cached as one .npz of column arrays per file in a
+`.ingest_cache` folder next to the logs. An entry is used while the log's
+size and mtime are unchanged; if only the mtime changed (a copy, a touch),
+a hash of the file decides. So after a participant is added only their log
+is parsed, and the others load in milliseconds. Warm the cache with
+
+    python responses.py Data
+"""
+import csv
+import glob
+import hashlib
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from bird_sim import BirdSimulation, game_settings  # noqa: E402
+from log_schema import (COLUMNS, V2_COLUMNS, EVENT_CODES, EVENT_NAMES, SCHEMA_VERSION,  # noqa: E402
+                        log_version, read_settings, settings_path, upgrade_row)
+
+CACHE_DIR = '.ingest_cache'
+CACHE_VERSION = 1  # bump when the parsing or the stored columns change
+HOLE_TOLERANCE = 0.01  # px within which a logged hole position matches the geometry
+
+DTYPES = {
+    'Timestamp': 'float64',
+    'EventCode': 'int8',
+    'Event': 'object',
+    'Response': 'float64',
+    'Intensity': 'float64',
+    'HoleY': 'float64',
+    'PredictedHoleY': 'float64',
+    'Optimal': 'float64',
+    'Score': 'float64',
+    'ScheduledTime': 'float64',
+}
+
+STAIRCASE = EVENT_CODES['Staircase Procedure']
+VIBRATION_SENT = EVENT_CODES['VibrationSent']
+FOOT_PEDAL_PRESS = EVENT_CODES['FootPedalPress']
+PLAYER_SHOOT = EVENT_CODES['PlayerShoot']
+CLOSE_MOUTH = EVENT_CODES['CloseMouth']
+COMPUTER_SHOOT = EVENT_CODES['ComputerShoot']
+OPTIMAL_MOMENT = EVENT_CODES['OptimalMoment']
+OPTIMAL_WINDOW_START = EVENT_CODES['OptimalWindowStart']
+OPTIMAL_WINDOW_END = EVENT_CODES['OptimalWindowEnd']
+
+
+def load_responses(file_path, expand_windows=False, cache=True):
+    """Reads one response log into a DataFrame with the current columns."""
+    df = _load_cached(file_path) if cache else None
+    if df is None:
+        df = parse_responses(file_path)
+        if cache:
+            _store_cached(file_path, df)
+    if expand_windows:
+        settings = read_settings(file_path)
+        if settings is None and (df['EventCode'] == OPTIMAL_WINDOW_START).any():
+            warnings.warn(f"{file_path}: no settings file, sizing optimal windows with bird_game.ini")
+        df = expand_optimal_windows(df, settings=settings)
+    return df
+
+
+def parse_responses(file_path):
+    """Parses a response log, without the cache."""
+    with open(file_path, newline='') as file:
+        reader = csv.reader(file)
+        version = log_version(next(reader, []))
+        if version == 1:
+            rows = [row for row in map(upgrade_row, reader) if row is not None]
+            df = pd.DataFrame(rows, columns=COLUMNS)
+    if version == SCHEMA_VERSION:
+        df = pd.read_csv(file_path, usecols=COLUMNS, float_precision='round_trip')
+    elif version == 2:
+        df = pd.read_csv(file_path, usecols=V2_COLUMNS, float_precision='round_trip')
+        df['ScheduledTime'] = None
+    elif version is None:
+        raise ValueError(f"{file_path}: not an experiment_responses log")
+    return df.astype(DTYPES)
+
+
+def cache_path(file_path):
+    folder, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(folder, CACHE_DIR, name + '.npz')
+
+
+def _file_hash(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_cached(file_path):
+    """The cached DataFrame of a log, or None if there is no valid entry."""
+    path = cache_path(file_path)
+    try:
+        stat = os.stat(file_path)
+        with np.load(path, allow_pickle=False) as entry:
+            if int(entry['cache_version']) != CACHE_VERSION or int(entry['size']) != stat.st_size:
+                return None
+            if int(entry['mtime_ns']) != stat.st_mtime_ns and str(entry['hash']) != _file_hash(file_path):
+                return None
+            columns = {name: entry[name] for name in COLUMNS if name != 'Event'}
+    except (OSError, KeyError, ValueError):
+        return None
+    names = np.array([EVENT_NAMES.get(code) for code in range(max(EVENT_NAMES) + 1)], dtype=object)
+    columns['Event'] = names[columns['EventCode']]
+    return pd.DataFrame(columns, columns=COLUMNS).astype(DTYPES)
+
+
+def _store_cached(file_path, df):
+    """Writes the cache entry of a log; a folder that cannot be written to
+    only means no caching."""
+    path = cache_path(file_path)
+    tmp = path + '.tmp'
+    try:
+        stat = os.stat(file_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as file:
+            np.savez(file, cache_version=CACHE_VERSION, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                     hash=_file_hash(file_path),
+                     **{name: df[name].to_numpy() for name in COLUMNS if name != 'Event'})
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def ingest(paths):
+    """Brings the cache entries of `paths` up to date. Returns the number of
+    logs that had to be parsed."""
+    parsed = 0
+    for file_path in paths:
+        if _load_cached(file_path) is None:
+            _store_cached(file_path, parse_responses(file_path))
+            parsed += 1
+    return parsed
+
+
+def _level_simulations(settings=None):
+    """One simulation per level, with the game settings (default: bird_game.ini)."""
+    if settings is None:
+        settings = game_settings()
+    sims = []
+    for level in (1, 2, 3):
+        sim = BirdSimulation(**settings)
+        sim.set_level(level)
+        sims.append(sim)
+    return sims
+
+
+def _window_frames(sims, level, hole_y, predicted_hole_y, end_hole_y):
+    """Frames in the optimal window opened by a frame that left the hole at
+    `hole_y` with `predicted_hole_y`, from the level geometry.
+
+    The hole's direction and the level are the ones that reproduce the
+    logged prediction, trying `level` (an index into `sims`) first. With an
+    `end_hole_y` (NaN if unknown) the run must also end there. Returns
+    (frames, level), or (None, level) if no level fits.
+    """
+    if np.isnan(hole_y) or np.isnan(predicted_hole_y):
+        return None, level
+    found = None
+    for candidate in [level] + [other for other in range(len(sims)) if other != level]:
+        sim = sims[candidate]
+        for direction in (1, -1):
+            if abs(sim.predictor.predict(hole_y, direction) - predicted_hole_y) >= HOLE_TOLERANCE:
+                continue
+            frames, end = sim.optimal_run(hole_y, direction)
+            if np.isnan(end_hole_y) or abs(end - end_hole_y) < HOLE_TOLERANCE:
+                return frames, candidate
+            if found is None:
+                found = frames, candidate
+    return found or (None, level)
+
+
+def expand_optimal_windows(df, frame_ms=None, settings=None):
+    """Replaces OptimalWindowStart/End pairs with one OptimalMoment row per frame.
+
+    The number of frames in a window comes from the game geometry: the hole
+    is stepped from the HoleY and PredictedHoleY of the start row for as
+    long as the prediction stays optimal, and must arrive at the HoleY of
+    the end row. The frames are spread evenly from the start up to (not
+    including) the end, so they follow the frame rate the session actually
+    ran at.
+
+    A window without a matching end (one still open at the end of the log,
+    one interrupted by a crash and closed on resume, or one spanning a
+    level-up) is laid out with the session's median frame time, taken from
+    the windows that did match, or `frame_ms` (default: the frame time of
+    the game's frame_rate) if none did, and cut off at the next window edge
+    or the last row. The geometry comes from `settings`, the BirdSimulation
+    arguments the game ran with (default: bird_game.ini).
+
+    Frames holding a PlayerShoot are dropped, as the game never logged those.
+    Only the first frame of a window has HoleY and PredictedHoleY.
+    """
+    codes = df['EventCode'].to_numpy()
+    is_edge = (codes == OPTIMAL_WINDOW_START) | (codes == OPTIMAL_WINDOW_END)
+    if not is_edge.any():
+        return df
+
+    timestamps = df['Timestamp'].to_numpy()
+    hole_y = df['HoleY'].to_numpy()
+    predicted_hole_y = df['PredictedHoleY'].to_numpy()
+    shots = np.sort(timestamps[codes == PLAYER_SHOOT])
+    edges = np.flatnonzero(is_edge)
+    sims = _level_simulations(settings)
+    if frame_ms is None:
+        frame_ms = sims[0].frame_ms
+
+    # (start row, frame count or None, frame time or None, cut-off time)
+    windows = []
+    level = 0
+    for position, row in enumerate(edges):
+        if codes[row] != OPTIMAL_WINDOW_START:
+            continue
+        following = edges[position + 1] if position + 1 < len(edges) else None
+        cutoff = timestamps[following] if following is not None else timestamps.max()
+        closed = following is not None and codes[following] == OPTIMAL_WINDOW_END
+        end_hole_y = hole_y[following] if closed else np.nan
+        count, level = _window_frames(sims, level, hole_y[row], predicted_hole_y[row], end_hole_y)
+        if closed and count is not None and not np.isnan(end_hole_y):
+            windows.append((row, count, (cutoff - timestamps[row]) / count, cutoff))
+        else:
+            windows.append((row, count, None, cutoff))
+
+    if not windows:
+        return df[~is_edge].reset_index(drop=True)
+
+    steps = [step for _, _, step, _ in windows if step is not None]
+    session_step = float(np.median(steps)) if steps else frame_ms
+
+    frame_times, frame_rows, first_frames = [], [], []
+    for row, count, step, cutoff in windows:
+        start = timestamps[row]
+        if step is None:
+            step = session_step
+            if count is None:
+                count = max(1, round((cutoff - start) / step))
+        times = start + np.arange(count) * step
+        times = times[(times < cutoff) | (np.arange(count) == 0)]
+        # Nearest shot to each frame time
+        nearest = np.searchsorted(shots, times)
+        gaps = np.full(len(times), np.inf)
+        for candidate in (nearest - 1, nearest):
+            valid = (candidate >= 0) & (candidate < len(shots))
+            gaps[valid] = np.minimum(gaps[valid], np.abs(shots[candidate[valid]] - times[valid]))
+        keep = gaps >= step / 2
+        frame_times.append(times[keep])
+        frame_rows.append(np.full(keep.sum(), row))
+        first_frames.append(np.arange(len(times))[keep] == 0)
+
+    frame_times = np.concatenate(frame_times)
+    frame_rows = np.concatenate(frame_rows)
+    first_frames = np.concatenate(first_frames)
+    moments = pd.DataFrame({'Timestamp': frame_times}, columns=COLUMNS)
+    moments['EventCode'] = OPTIMAL_MOMENT
+    moments['Event'] = 'OptimalMoment'
+    moments['Intensity'] = df['Intensity'].to_numpy()[frame_rows]
+    moments['HoleY'] = np.where(first_frames, hole_y[frame_rows], np.nan)
+    moments['PredictedHoleY'] = np.where(first_frames, predicted_hole_y[frame_rows], np.nan)
+
+    expanded = pd.concat([df[~is_edge], moments], ignore_index=True).astype(DTYPES)
+    return expanded.sort_values('Timestamp', kind='mergesort', ignore_index=True)
+
+
+if __name__ == "__main__":
+    import time
+
+    folders = sys.argv[1:] or ['.']
+    for folder in folders:
+        paths = sorted(glob.glob(os.path.join(folder, "experiment_responses_*.csv")))
+        start = time.perf_counter()
+        parsed = ingest(paths)
+        print(f"{folder}: {len(paths)} logs, {parsed} parsed, {len(paths) - parsed} cached "
+              f"({time.perf_counter() - start:.2f} s)")
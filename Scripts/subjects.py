@@ -0,0 +1,38 @@
+"""Runs a per-subject analysis over many logs, optionally in parallel.
+
+Subjects are independent, so `map_subjects` fans them out over a process
+pool. Each worker loads and analyses one log at a time and sends back only
+its small result, so memory per worker is that of one subject however big
+the cohort; `max_tasks_per_child` additionally recycles workers. Results
+always come back in subject order (Subject2 before Subject10), whatever
+the number of workers or the order the files were listed in, so group
+statistics are reproducible.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+
+def subject_sort_key(path):
+    """Orders file names with their numbers compared as numbers."""
+    parts = re.split(r'(\d+)', os.path.basename(path))
+    return [int(part) if part.isdigit() else part for part in parts], path
+
+
+def map_subjects(function, paths, jobs=None, chunksize=1, max_tasks_per_child=None):
+    """Returns [(path, function(path)), ...] in subject order.
+
+    `jobs` is the number of worker processes (None: one per CPU, 1: no
+    pool); `chunksize` subjects are sent to a worker at a time.
+    """
+    paths = sorted(paths, key=subject_sort_key)
+    if jobs == 1 or len(paths) <= 1:
+        return [(path, function(path)) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=max_tasks_per_child) as pool:
+        return list(zip(paths, pool.map(function, paths, chunksize=chunksize)))
+
+
+def add_arguments(parser):
+    """Adds the --jobs and --chunksize options of the analysis scripts."""
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per CPU, 1 = no pool)")
+    parser.add_argument('--chunksize', type=int, default=1, help="subjects sent to a worker at a time")
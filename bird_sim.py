@@ -0,0 +1,438 @@
+"""Headless, fixed-timestep simulation of the Feed the Bird game logic.
+
+Holds the hole/food physics, scoring, computer shots, vibration scheduling and
+level-ups that `run_game` in Bird_Game.py used to keep in module globals.
+Nothing in here touches pygame, the serial port or the clock: the caller
+passes in the current time, so the same code drives the real-time game and
+scripted runs at thousands of ticks per second.
+"""
+import os
+import time
+from collections import namedtuple
+from configparser import ConfigParser
+
+from food_pool import FoodPool, HIT_WALL
+
+# Frames per second of the game loop ([game] frame_rate in bird_game.ini).
+# The recorded sessions ran at about 25 (frames of ~40 ms), so the hole
+# moves at the speed the participants saw; 30 changes the paradigm.
+FRAME_RATE = 25
+FRAME_MS = 1000 / FRAME_RATE
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bird_game.ini")
+# [game] keys of bird_game.ini that are BirdSimulation arguments
+GAME_SETTINGS = ('hole_speed', 'hole_height', 'food_speed', 'computer_shot_interval', 'cooldown_time',
+                 'frame_rate')
+
+# Default geometry, identical to the values used by Bird_Game.py
+GAME_SCREEN_WIDTH = 1920
+GAME_SCREEN_HEIGHT = 1000
+WALL_X = GAME_SCREEN_WIDTH // 3
+WALL_Y = 50
+WALL_HEIGHT = 600
+BIRD_X = WALL_X + 200
+BIRD_Y = GAME_SCREEN_HEIGHT // 3
+FOOD_START_X = 100  # where food is shot from
+
+FOODS_PER_LEVEL = 50
+COOLDOWN_TIME = 700  # ms between two accepted player shots
+VIBRATION_LEAD = 50  # ms before the predicted next shot
+
+# One game event produced by the simulation. `data` is a dict whose keys
+# depend on `kind` (e.g. current_hole_y / predicted_hole_y / optimal).
+SimEvent = namedtuple('SimEvent', ['timestamp', 'kind', 'data'])
+
+
+class OptimalPredictor:
+    """Closed-form hole prediction for one level.
+
+    The hole runs a triangle wave over L = wall_height - hole_height pixels.
+    Food shot now meets the hole after it has covered D more pixels, D being
+    the distance the hole travels while the food flies, so the prediction is
+    the current position moved D along the wave.
+    """
+
+    def __init__(self, hole_speed, hole_height, food_speed,
+                 wall_x=WALL_X, wall_y=WALL_Y, wall_height=WALL_HEIGHT, bird_y=BIRD_Y):
+        self.hole_speed = hole_speed
+        self.hole_height = hole_height
+        self.lower = wall_y
+        self.span = wall_height - hole_height  # L
+        # Travel time in frames, as the hole moves hole_speed px per frame
+        self.travel = hole_speed * (wall_x - FOOD_START_X) / food_speed  # D
+        self.optimal_min = bird_y - hole_height
+        self.optimal_max = bird_y
+
+    def predict(self, hole_y, direction):
+        """Hole position when food shot now reaches the wall, with bouncing."""
+        L = self.span
+        # Displacement during travel (including direction), reflected into range
+        x_eff = (hole_y - self.lower + self.travel * direction) % (2 * L)
+        if x_eff > L:
+            return self.lower + (2 * L - x_eff)
+        return self.lower + x_eff
+
+    def is_optimal(self, predicted_hole_y):
+        """True if a hole at `predicted_hole_y` lets food reach the bird."""
+        return self.optimal_min <= predicted_hole_y <= self.optimal_max
+
+
+class BirdSimulation:
+    """Game state plus the per-frame update rules of Feed the Bird."""
+
+    def __init__(self, hole_speed=10, hole_height=100, food_speed=30,
+                 wall_x=WALL_X, wall_y=WALL_Y, wall_height=WALL_HEIGHT,
+                 bird_x=BIRD_X, bird_y=BIRD_Y,
+                 player_shots=8000, computer_shots=2000,
+                 computer_shot_interval=5, cooldown_time=COOLDOWN_TIME,
+                 start_time=0.0, frame_rate=FRAME_RATE):
+        self.hole_speed = hole_speed
+        self.hole_height = hole_height
+        self.food_speed = food_speed
+        self.wall_x = wall_x
+        self.wall_y = wall_y
+        self.wall_height = wall_height
+        self.bird_x = bird_x
+        self.bird_y = bird_y
+        self.computer_shot_interval = computer_shot_interval
+        self.cooldown_time = cooldown_time
+        self.frame_rate = frame_rate
+        self.frame_ms = 1000 / frame_rate
+        # Level 1 settings, later levels are derived from them in set_level
+        self.base_hole_speed = hole_speed
+        self.base_hole_height = hole_height
+        self.base_food_speed = food_speed
+        self.predictor = self._make_predictor()
+
+        self.hole_y = wall_y
+        self.hole_y_direction = 1
+        self.in_optimal_window = False
+        self.foods = FoodPool()
+        self.beak_open = True
+        self.score = 0
+        self.foods_fed = 0
+        self.current_level = 1
+        self.current_trial = 0
+        self.remaining_player_shots = player_shots
+        self.remaining_computer_shots = computer_shots
+        self.last_shot_time = 0
+        self.last_computer_shot_time = 0
+        self.shot_times = []
+        self.vibration_times = []
+        self.game_over = False
+
+        self.time_ms = start_time
+        self.tick_count = 0
+        self._shot_this_frame = False
+        self._prediction_key = None
+        self._prediction = None
+
+    def settings(self):
+        """The level 1 geometry and timing this simulation was created with,
+        as BirdSimulation arguments (what log_schema.write_settings stores)."""
+        return {'hole_speed': self.base_hole_speed, 'hole_height': self.base_hole_height,
+                'food_speed': self.base_food_speed, 'wall_x': self.wall_x, 'wall_y': self.wall_y,
+                'wall_height': self.wall_height, 'bird_x': self.bird_x, 'bird_y': self.bird_y,
+                'computer_shot_interval': self.computer_shot_interval, 'cooldown_time': self.cooldown_time,
+                'frame_rate': self.frame_rate}
+
+    # --- Prediction -------------------------------------------------------
+
+    def _make_predictor(self):
+        return OptimalPredictor(self.hole_speed, self.hole_height, self.food_speed,
+                                self.wall_x, self.wall_y, self.wall_height, self.bird_y)
+
+    def predict_hole_y(self):
+        """Hole position when food shot now reaches the wall, with bouncing.
+        Computed once per hole position, however often it is asked for."""
+        key = (self.hole_y, self.hole_y_direction, self.predictor)
+        if key != self._prediction_key:
+            self._prediction_key = key
+            self._prediction = self.predictor.predict(self.hole_y, self.hole_y_direction)
+        return self._prediction
+
+    def project_hole(self, n):
+        """Hole positions after each of the next `n` frames, without changing
+        the state. Returns a list of (hole_y, hit_bottom) pairs."""
+        hole_y, direction = self.hole_y, self.hole_y_direction
+        path = []
+        for _ in range(n):
+            hole_y, direction, hit_bottom = self._move_hole(hole_y, direction)
+            path.append((hole_y, hit_bottom))
+        return path
+
+    def is_optimal(self, predicted_hole_y):
+        """True if a hole at `predicted_hole_y` lets food reach the bird."""
+        return self.predictor.is_optimal(predicted_hole_y)
+
+    def optimal_run(self, hole_y, direction, limit=1000):
+        """Follows the hole from a frame that left it at (hole_y, direction)
+        for as long as the prediction stays optimal, without changing the
+        state. Returns the number of optimal frames, that one included, and
+        where the hole is after the first frame that is not."""
+        frames = 1
+        while frames < limit:
+            hole_y, direction, _ = self._move_hole(hole_y, direction)
+            if not self.is_optimal(self.predictor.predict(hole_y, direction)):
+                break
+            frames += 1
+        return frames, hole_y
+
+    # --- Player input -----------------------------------------------------
+
+    def player_shoot(self, now):
+        """Fire a player shot at `now` (ms). Returns the PlayerShoot event or
+        None if the shot was ignored because of the cooldown."""
+        if now - self.last_shot_time < self.cooldown_time:
+            return None
+
+        predicted_hole_y = self.predict_hole_y()
+        event = SimEvent(now, 'PlayerShoot', {
+            'current_hole_y': self.hole_y,
+            'predicted_hole_y': predicted_hole_y,
+            'optimal': self.is_optimal(predicted_hole_y),
+            'score': self.score,
+        })
+
+        self.foods.add(FOOD_START_X, self.bird_y, player_shot=True)
+        self.shot_times.append(now)
+        if len(self.shot_times) > 1:
+            interval = self.shot_times[-1] - self.shot_times[-2]
+            predicted_next_shot = self.shot_times[-1] + interval
+            self.vibration_times.append(predicted_next_shot - VIBRATION_LEAD)
+
+        self.current_trial += 1
+        self.remaining_player_shots -= 1
+        self.last_shot_time = now
+        self._shot_this_frame = True
+        return event
+
+    def close_mouth(self, now):
+        self.beak_open = False
+        return SimEvent(now, 'CloseMouth', {})
+
+    def open_mouth(self, now):
+        self.beak_open = True
+        return SimEvent(now, 'OpenMouth', {})
+
+    def pop_due_vibration(self, now):
+        """Pop the earliest scheduled vibration time if it is due at `now`."""
+        if self.vibration_times and now >= self.vibration_times[0]:
+            return self.vibration_times.pop(0)
+        return None
+
+    def take_vibrations(self):
+        """Removes and returns every scheduled vibration time, for callers
+        that fire vibrations themselves instead of via pop_due_vibration."""
+        times, self.vibration_times = self.vibration_times, []
+        return times
+
+    # --- Per-frame update -------------------------------------------------
+
+    def advance(self, now):
+        """Move the hole and foods by one frame. Returns the events produced."""
+        events = []
+
+        # Hole bounce; the computer shoots whenever the hole hits the bottom
+        self.hole_y, self.hole_y_direction, hit_bottom = self._move_hole(self.hole_y, self.hole_y_direction)
+        if hit_bottom:
+            self._computer_shoot(now)
+            events.append(SimEvent(now, 'ComputerShoot', {}))
+
+        # Optimal moment: no shot this frame and the prediction hits the bird
+        predicted_hole_y = self.predict_hole_y()
+        optimal = self.is_optimal(predicted_hole_y)
+        if not self._shot_this_frame and optimal:
+            events.append(SimEvent(now, 'OptimalMoment', {
+                'current_hole_y': self.hole_y,
+                'predicted_hole_y': predicted_hole_y,
+            }))
+        self._shot_this_frame = False
+
+        # Window edges, which is all the log keeps of the OptimalMoment frames
+        if optimal != self.in_optimal_window:
+            self.in_optimal_window = optimal
+            events.append(SimEvent(now, 'OptimalWindowStart' if optimal else 'OptimalWindowEnd', {
+                'current_hole_y': self.hole_y,
+                'predicted_hole_y': predicted_hole_y,
+            }))
+
+        self._update_foods(now, events)
+        self.tick_count += 1
+        return events
+
+    def step(self, actions=()):
+        """Advance the simulated clock by one fixed frame and apply `actions`
+        ('shoot', 'close', 'open', 'foot') in the same order run_game does."""
+        now = self.time_ms
+        events = []
+        if self.pop_due_vibration(now) is not None:
+            events.append(SimEvent(now, 'VibrationSent', {}))
+        for action in actions:
+            if action == 'shoot':
+                event = self.player_shoot(now)
+                if event:
+                    events.append(event)
+            elif action == 'close':
+                events.append(self.close_mouth(now))
+            elif action == 'open':
+                events.append(self.open_mouth(now))
+            elif action == 'foot':
+                events.append(SimEvent(now, 'FootPedalPress', {}))
+        events.extend(self.advance(now))
+        self.time_ms += self.frame_ms
+        return events
+
+    def set_level(self, level):
+        """Switch to `level`, applying its hole and food settings."""
+        self.current_level = level
+        self.foods_fed = 0
+        self.hole_speed = self.base_hole_speed
+        self.food_speed = self.base_food_speed
+        self.hole_height = self.base_hole_height
+        if level >= 2:
+            self.hole_speed += 4  # Increase hole speed to make it harder
+            self.food_speed += 2  # Optionally increase food speed as well
+        if level >= 3:
+            self.hole_height -= 10  # Reduce the height of the hole to make it harder
+        self.predictor = self._make_predictor()
+
+    def _move_hole(self, hole_y, direction):
+        hole_y += self.hole_speed * direction
+        if hole_y <= self.wall_y:
+            return hole_y, 1, False
+        if hole_y + self.hole_height >= self.wall_y + self.wall_height:
+            return hole_y, -1, True
+        return hole_y, direction, False
+
+    def _computer_shoot(self, now):
+        if now - self.last_computer_shot_time >= self.computer_shot_interval and self.remaining_computer_shots > 0:
+            self.foods.add(FOOD_START_X, self.bird_y, player_shot=False)
+            self.last_computer_shot_time = now
+            self.remaining_computer_shots -= 1
+
+    def _update_foods(self, now, events):
+        resolved = self.foods.advance(self.food_speed, self.wall_x, self.hole_y,
+                                      self.hole_y + self.hole_height, self.bird_x - 30)
+        for outcome, player_shot in resolved:
+            if outcome == HIT_WALL:
+                kind = 'HitWall'
+                self.score -= 1
+            elif player_shot:
+                if self.beak_open:
+                    kind = 'Fed'
+                    self.score += 10
+                    self.foods_fed += 1
+                else:
+                    kind = 'Missed'
+                    self.score -= 5
+            else:
+                if self.beak_open:
+                    kind = 'ComputerFed'
+                    self.score -= 5
+                else:
+                    kind = 'Blocked'
+                    self.score += 5
+            events.append(SimEvent(now, kind, {'score': self.score}))
+
+        if self.foods_fed == FOODS_PER_LEVEL:
+            self.foods_fed = 0
+            if self.current_level < 3:
+                self.set_level(self.current_level + 1)
+                events.append(SimEvent(now, 'LevelUp', {'level': self.current_level}))
+            else:
+                self.game_over = True
+                events.append(SimEvent(now, 'GameOver', {'score': self.score}))
+
+
+# Messages shown on screen for each scoring event
+EVENT_MESSAGES = {
+    'HitWall': "Hit the Wall!",
+    'Fed': "Fed the Bird!",
+    'Missed': "Missed the Bird!",
+    'ComputerFed': "Computer Fed the Bird!",
+    'Blocked': "Player Blocked the Bird!",
+}
+
+
+def game_settings(path=CONFIG_FILE):
+    """BirdSimulation arguments set in the [game] section of `path`; missing
+    keys (or a missing file) keep the defaults."""
+    config = ConfigParser()
+    config.read(path)
+    return {name: config.getint('game', name) for name in GAME_SETTINGS if config.has_option('game', name)}
+
+
+def run_script(sim, script, max_ticks, stop_on_game_over=True):
+    """Run `sim` headless for up to `max_ticks` frames.
+
+    `script` is an iterable of (tick, action) pairs sorted by tick, e.g.
+    [(10, 'shoot'), (40, 'close'), (45, 'open')]. Returns all events.
+    """
+    script = iter(script)
+    pending = next(script, None)
+    events = []
+    for tick in range(max_ticks):
+        actions = []
+        while pending is not None and pending[0] <= tick:
+            actions.append(pending[1])
+            pending = next(script, None)
+        events.extend(sim.step(actions))
+        if stop_on_game_over and sim.game_over:
+            break
+    return events
+
+
+def periodic_shots(every, max_ticks, offset=0):
+    """Scripted input stream that shoots every `every` ticks."""
+    return [(tick, 'shoot') for tick in range(offset, max_ticks, every)]
+
+
+def top_up_foods(sim, target, rng):
+    """Stress mode: fires foods at random heights along the wall until
+    `target` are in flight, half of them player shots."""
+    for _ in range(target - len(sim.foods)):
+        sim.foods.add(FOOD_START_X, rng.uniform(sim.wall_y, sim.wall_y + sim.wall_height),
+                      player_shot=rng.random() < 0.5)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Feed the Bird logic headless.")
+    parser.add_argument('--ticks', type=int, default=100000)
+    parser.add_argument('--shoot-every', type=int, default=30, help="ticks between player shots")
+    parser.add_argument('--stress', type=int, metavar='FOODS',
+                        help="keep FOODS foods in flight and report the update time per frame")
+    args = parser.parse_args()
+
+    if args.stress:
+        import random
+        from frame_timing import FrameTimer
+
+        sim = BirdSimulation()
+        rng = random.Random(0)
+        timer = FrameTimer(['top_up', 'advance'])
+        for tick in range(args.ticks):
+            timer.start_frame()
+            top_up_foods(sim, args.stress, rng)
+            timer.mark('top_up')
+            sim.advance(tick * sim.frame_ms)
+            timer.mark('advance')
+        print(f"{args.ticks} frames with {args.stress} foods in flight")
+        timer.print_summary()
+        raise SystemExit
+
+    sim = BirdSimulation()
+    start = time.perf_counter()
+    events = run_script(sim, periodic_shots(args.shoot_every, args.ticks), args.ticks)
+    elapsed = time.perf_counter() - start
+
+    counts = {}
+    for event in events:
+        counts[event.kind] = counts.get(event.kind, 0) + 1
+    print(f"Simulated {sim.tick_count} ticks in {elapsed:.2f} s "
+          f"({sim.tick_count / elapsed:.0f} ticks/s)")
+    print(f"Level: {sim.current_level}, Score: {sim.score}, Game over: {sim.game_over}")
+    for kind, count in sorted(counts.items()):
+        print(f"  {kind}: {count}")
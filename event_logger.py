@@ -0,0 +1,106 @@
+"""Background CSV logger for the game's response log.
+
+`AsyncCsvLogger.writerow` only puts the row on a bounded queue; a worker
+thread writes the rows in batches, flushes and fsyncs the file periodically
+and drains everything that is still queued when the logger is closed.
+It has the same `writerow` method as `csv.writer`, so it can be handed to
+`log_response` and the staircase/game loops unchanged.
+"""
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+BATCH_SIZE = 256        # rows written per csv.writerows call
+MAX_QUEUED_ROWS = 100000
+FLUSH_INTERVAL = 1.0    # seconds between flush + fsync
+
+_STOP = object()
+
+
+class AsyncCsvLogger:
+    """Writes CSV rows from a worker thread so the caller only enqueues."""
+
+    def __init__(self, filename, header=None, mode='w', batch_size=BATCH_SIZE,
+                 max_queued_rows=MAX_QUEUED_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.rows_queued = 0
+        self._count_lock = threading.Lock()  # rows are queued from more than one thread
+        self._queue = queue.Queue(maxsize=max_queued_rows)
+        self._file = open(filename, mode=mode, newline='')
+        self._writer = csv.writer(self._file)
+        if header:
+            self._writer.writerow(header)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="csv-logger", daemon=True)
+        self._thread.start()
+        # Quitting through exit() must not lose queued rows
+        atexit.register(self.close)
+
+    def writerow(self, row):
+        """Queues one row. Blocks only if the queue is full, so no row is dropped."""
+        with self._count_lock:
+            self.rows_queued += 1
+        self._queue.put(row)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        """Writes every queued row, fsyncs and closes the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                row = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                row = None
+
+            batch = []
+            while row is not None:
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    row = None
+            if batch:
+                self._write(batch)
+
+            if stopping or time.monotonic() - last_flush >= self.flush_interval:
+                self._sync()
+                last_flush = time.monotonic()
+        self._file.close()
+
+    def _write(self, batch):
+        self._writer.writerows(batch)
+        self.rows_written += len(batch)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,99 @@
+"""Preallocated structure-of-arrays pool for the food projectiles.
+
+Every food in flight is a row of parallel NumPy arrays (position, passing
+flag, player/computer flag) instead of a dict in a list, so a frame moves
+and tests all of them with a handful of array operations. The live foods
+are kept packed at the front of the arrays in launch order, which is the
+order the old list was scanned in; resolved foods are squeezed out with
+one masked copy per frame instead of a `list.remove` each. The arrays
+double in size if the pool ever fills up.
+"""
+import numpy as np
+
+INITIAL_CAPACITY = 64
+
+# What happened to a food this frame
+HIT_WALL = 0
+REACHED_BIRD = 1
+
+FIELDS = ('x', 'y', 'passing_hole', 'player_shot')
+
+
+class FoodPool:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.passing_hole = np.zeros(capacity, dtype=bool)
+        self.player_shot = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.lead_x = None  # x of the oldest food, which is always in front
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x, y, player_shot):
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.passing_hole[i] = False
+        self.player_shot[i] = player_shot
+        if not self.count:
+            self.lead_x = float(x)
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+        self.lead_x = None
+
+    def positions(self):
+        """(x, y) arrays of the foods in flight, in launch order."""
+        return self.x[:self.count], self.y[:self.count]
+
+    def advance(self, dx, wall_x, hole_top, hole_bottom, bird_reach):
+        """Moves every food `dx` to the right and resolves the ones that are done.
+
+        A food at the wall passes if the hole covers it; a player's food
+        that does not is stopped by the wall, a computer's flies on. Foods
+        at `bird_reach` reach the bird. Returns (outcome, player_shot) pairs
+        of the resolved foods in launch order; those foods are removed.
+        """
+        n = self.count
+        if not n:
+            return []
+        x = self.x[:n]
+        x += dx
+        # All foods fly at the same speed, so nothing can happen to any of
+        # them before the leading one reaches the wall
+        self.lead_x += dx
+        if self.lead_x < wall_x and self.lead_x < bird_reach:
+            return []
+        y = self.y[:n]
+        passing = self.passing_hole[:n]
+        player = self.player_shot[:n]
+
+        at_wall = (x >= wall_x) & ~passing
+        enters = at_wall & (hole_top <= y) & (y <= hole_bottom)
+        passing |= enters
+        hit_wall = at_wall & ~enters & player
+        done = hit_wall | (x >= bird_reach)
+        if not done.any():
+            return []
+
+        resolved = list(zip(np.where(hit_wall[done], HIT_WALL, REACHED_BIRD).tolist(), player[done].tolist()))
+        keep = ~done
+        kept = int(keep.sum())
+        for name in FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:n][keep]
+        self.count = kept
+        self.lead_x = float(self.x[0]) if kept else None
+        return resolved
+
+    def _grow(self):
+        for name in FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(2 * len(array), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,224 @@
+"""Chunked recording of the Arduino force stream.
+
+The serial I/O worker (serial_io.SerialWorker) drains everything waiting on
+the port in one `read()`, splits it into lines and parses the whole batch.
+Every sample of a batch is stamped with the arrival time of its bytes and
+pushed into the preallocated ring buffer of a ForceRecorder, whose thread
+empties it into the force file in chunks. So the sensor can stream at its
+native rate (hundreds of Hz and up) and samples do not sit in the OS buffer
+picking up stale timestamps.
+
+The force file is binary and append-only: a HEADER_SIZE byte header
+followed by fixed-width little-endian records of two float64s (timestamp in
+ms, force). A chunk is written as one block of records with no text
+formatting, and the file is fsynced every FSYNC_INTERVAL seconds rather
+than on every chunk. After a crash at most that much data is lost, plus a
+torn last record, which the reader ignores. `read_force_file` memory-maps
+the records, and `convert_to_csv` (also the command line of this module)
+writes the old Timestamp,Force CSV:
+
+    python force_reader.py force_data_Subject1.force [force_data_Subject1.csv]
+"""
+import csv
+import os
+import struct
+import threading
+import time
+from array import array
+
+import numpy as np
+
+RING_CAPACITY = 1 << 17      # samples buffered between two writer flushes
+WRITE_INTERVAL = 0.25        # seconds between writer flushes
+FSYNC_INTERVAL = 2.0         # seconds between fsyncs of the force file
+
+MAGIC = b'FBFORCE\0'
+VERSION = 1
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('force', '<f8')])
+# magic, version, record size, creation time (s since the epoch), padded
+HEADER = struct.Struct('<8sHHd')
+HEADER_SIZE = 32
+CONVERT_CHUNK = 1 << 16      # records formatted per step of convert_to_csv
+
+
+class ForceRingBuffer:
+    """Fixed-size ring of (timestamp, force) samples, safe for one producer
+    and one consumer thread."""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0      # next slot to write
+        self.count = 0
+        self.overruns = 0  # samples dropped because the writer fell behind
+        self._lock = threading.Lock()
+
+    def push_many(self, timestamps, values):
+        with self._lock:
+            for timestamp, value in zip(timestamps, values):
+                if self.count == self.capacity:
+                    self.overruns += 1
+                    continue
+                self.timestamps[self.head] = timestamp
+                self.values[self.head] = value
+                self.head = (self.head + 1) % self.capacity
+                self.count += 1
+
+    def drain(self):
+        """Removes and returns every buffered sample as two arrays."""
+        with self._lock:
+            count = self.count
+            start = (self.head - count) % self.capacity
+            end = start + count
+            if end <= self.capacity:
+                timestamps = self.timestamps[start:end]
+                values = self.values[start:end]
+            else:
+                end -= self.capacity
+                timestamps = self.timestamps[start:] + self.timestamps[:end]
+                values = self.values[start:] + self.values[:end]
+            self.count = 0
+        return timestamps, values
+
+
+def parse_lines(chunk):
+    """Parses complete newline-terminated lines of `chunk`.
+
+    Returns (values, frames, rest, bad): force values, protocol frames
+    (lines starting with '!'), the trailing partial line to prepend to the
+    next chunk, and the number of lines that are neither.
+    """
+    lines = chunk.split(b'\n')
+    rest = lines.pop()
+    values = []
+    frames = []
+    bad = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(b'!'):
+            frames.append(line)
+            continue
+        try:
+            values.append(float(line))
+        except ValueError:
+            bad += 1
+    return values, frames, rest, bad
+
+
+class ForceRecorder:
+    """Writes the samples passed to add_samples() to `filename` in chunks."""
+
+    def __init__(self, filename, ring_capacity=RING_CAPACITY, write_interval=WRITE_INTERVAL):
+        self.filename = filename
+        self.write_interval = write_interval
+        self.ring = ForceRingBuffer(ring_capacity)
+        self.samples = 0
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="force-writer", daemon=True)
+
+    def start(self):
+        self._writer.start()
+
+    def add_samples(self, timestamps, values):
+        """Buffers samples; called from the serial I/O thread."""
+        self.ring.push_many(timestamps, values)
+        self.samples += len(values)
+
+    def stop(self):
+        """Stops the writer after it has written whatever is still buffered."""
+        self._stop.set()
+        self._writer.join()
+        print(f"Force data thread has stopped ({self.samples} samples, "
+              f"{self.ring.overruns} dropped).")
+
+    def _write_loop(self):
+        with open(self.filename, mode='ab') as file:
+            if file.tell() == 0:
+                file.write(make_header())
+            last_sync = time.monotonic()
+            while True:
+                stopping = self._stop.wait(self.write_interval)
+                timestamps, values = self.ring.drain()
+                if timestamps:
+                    records = np.empty(len(timestamps), dtype=RECORD_DTYPE)
+                    records['timestamp'] = np.frombuffer(timestamps)
+                    records['force'] = np.frombuffer(values)
+                    file.write(records.tobytes())
+                    file.flush()
+                if stopping or time.monotonic() - last_sync >= FSYNC_INTERVAL:
+                    os.fsync(file.fileno())
+                    last_sync = time.monotonic()
+                if stopping:
+                    break
+
+
+def make_header(created=None):
+    header = HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, time.time() if created is None else created)
+    return header.ljust(HEADER_SIZE, b'\0')
+
+
+def read_header(file):
+    """Returns (version, created) of an open force file."""
+    data = file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{file.name} is too short to be a force file")
+    magic, version, record_size, created = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{file.name} is not a force file")
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{file.name} has unsupported version {version} (record size {record_size})")
+    return version, created
+
+
+def read_force_file(filename, mmap=True):
+    """The complete records of a force file as a structured array with
+    'timestamp' and 'force' fields, memory-mapped unless `mmap` is False.
+    A record cut off by a crash at the end of the file is left out."""
+    with open(filename, 'rb') as file:
+        read_header(file)
+    count = (os.path.getsize(filename) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    if mmap:
+        return np.memmap(filename, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+    return np.fromfile(filename, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+
+
+def _force_text(value):
+    """A force value as the firmware printed it: whole numbers (analogRead
+    counts) without a decimal point."""
+    return int(value) if value.is_integer() else value
+
+
+def convert_to_csv(filename, csv_filename=None):
+    """Writes a force file as Timestamp,Force CSV and returns the CSV's name.
+
+    The output has the layout the recorder used to write. Forces are written
+    the way the firmware prints them (`512`, not `512.0`). Text that does not
+    survive a trip through float, such as trailing zeros after the decimal
+    point, cannot be recovered, and lines that were not numbers were never
+    recorded in the binary file.
+    """
+    if csv_filename is None:
+        csv_filename = os.path.splitext(filename)[0] + ".csv"
+    records = read_force_file(filename)
+    with open(csv_filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Timestamp', 'Force'])
+        for start in range(0, len(records), CONVERT_CHUNK):
+            chunk = records[start:start + CONVERT_CHUNK]
+            writer.writerows(zip(chunk['timestamp'].tolist(), map(_force_text, chunk['force'].tolist())))
+    return csv_filename
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a binary force recording to CSV.")
+    parser.add_argument('force_file')
+    parser.add_argument('csv_file', nargs='?', help="default: the force file's name with .csv")
+    args = parser.parse_args()
+    print(f"Wrote {convert_to_csv(args.force_file, args.csv_file)}")
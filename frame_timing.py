@@ -0,0 +1,122 @@
+"""Per-frame timing of the game loop.
+
+A FrameTimer splits every frame into named phases (event polling, the
+simulation step, drawing, presenting, waiting for the next tick) and keeps
+the duration of each one, the interval between frame starts, the number of
+frames missed against the target rate and the input-to-log latency. The hot
+path is a `perf_counter` call and an `array.append` per phase. At the end of
+a session `write_report` stores p50/p95/p99, histograms and drop counts in a
+JSON sidecar next to the response CSV, which is what a lab PC is certified
+against.
+"""
+import json
+import math
+import os
+import time
+from array import array
+
+HISTOGRAM_BIN_MS = 1.0   # width of the histogram buckets
+HISTOGRAM_MAX_MS = 100   # durations above this land in the last bucket
+DROP_TOLERANCE = 1.5     # a frame interval this many target frames long counts as a drop
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_samples)), 1)
+    return sorted_samples[rank - 1]
+
+
+def histogram(samples, bin_ms=HISTOGRAM_BIN_MS, max_ms=HISTOGRAM_MAX_MS):
+    """Counts per `bin_ms` bucket; the last bucket collects everything above max_ms."""
+    counts = [0] * (int(max_ms / bin_ms) + 1)
+    last = len(counts) - 1
+    for sample in samples:
+        counts[min(int(sample / bin_ms), last)] += 1
+    return counts
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) if ordered else None,
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'max': ordered[-1] if ordered else None,
+        'histogram': histogram(ordered),
+    }
+
+
+def sidecar_path(csv_filename):
+    """experiment_responses_X.csv -> experiment_responses_X_timing.json"""
+    return os.path.splitext(csv_filename)[0] + "_timing.json"
+
+
+class FrameTimer:
+    """Collects phase durations (ms) of a loop running at `target_fps`.
+
+    Call `start_frame()` at the top of each frame and `mark(phase)` at the
+    end of each phase; a phase lasts from the previous mark.
+    """
+
+    def __init__(self, phases, target_fps=30):
+        self.phases = list(phases)
+        self.target_ms = 1000 / target_fps
+        self.durations = {phase: array('d') for phase in self.phases}
+        self.frame_times = array('d')      # start-to-start frame intervals
+        self.input_latencies = array('d')  # input polled -> row queued for the log
+        self.dropped_frames = 0
+        self.late_frames = 0
+        self._frame_start = None
+        self._last_mark = None
+
+    def start_frame(self):
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            interval = (now - self._frame_start) * 1000
+            self.frame_times.append(interval)
+            if interval > self.target_ms * DROP_TOLERANCE:
+                self.late_frames += 1
+                self.dropped_frames += round(interval / self.target_ms) - 1
+        self._frame_start = now
+        self._last_mark = now
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.durations[phase].append((now - self._last_mark) * 1000)
+        self._last_mark = now
+
+    def input_logged(self):
+        """Records the latency of an input event whose row was just queued."""
+        self.input_latencies.append((time.perf_counter() - self._frame_start) * 1000)
+
+    def report(self):
+        return {
+            'target_frame_ms': self.target_ms,
+            'frames': len(self.frame_times) + (self._frame_start is not None),
+            'late_frames': self.late_frames,
+            'dropped_frames': self.dropped_frames,
+            'histogram_bin_ms': HISTOGRAM_BIN_MS,
+            'frame_interval': summarize(self.frame_times),
+            'input_to_log': summarize(self.input_latencies),
+            'phases': {phase: summarize(self.durations[phase]) for phase in self.phases},
+        }
+
+    def write_report(self, filename):
+        with open(filename, mode='w') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def print_summary(self):
+        interval = summarize(self.frame_times)
+        if not interval['count']:
+            return
+        print(f"Frame time p50 {interval['p50']:.2f} ms, p95 {interval['p95']:.2f} ms, "
+              f"p99 {interval['p99']:.2f} ms; {self.late_frames} late frames, "
+              f"{self.dropped_frames} dropped at {1000 / self.target_ms:.0f} Hz")
+        for phase in self.phases:
+            stats = summarize(self.durations[phase])
+            if stats['count']:
+                print(f"  {phase:<8} p50 {stats['p50']:.2f} ms, p95 {stats['p95']:.2f} ms, p99 {stats['p99']:.2f} ms")
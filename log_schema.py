@@ -0,0 +1,218 @@
+"""Versioned column layout of the experiment_responses logs.
+
+Version 1 (the files in Data/) packs event data into the Experiment column,
+e.g. `PlayerShoot; current_hole_y=270.00; predicted_hole_y=90.00; optimal=False`,
+with an undeclared fifth `Score=...;` column. Version 2 gives every field its
+own typed column and tags each row with a numeric event code:
+
+    Timestamp       float   ms since the epoch
+    EventCode       int     see EVENT_CODES
+    Event           str     event name (same names as version 1)
+    Response        int     1/0 for staircase and foot-pedal rows
+    Intensity       float   vibration intensity
+    HoleY           float   hole position when the event happened
+    PredictedHoleY  float   hole position when food shot now reaches the wall
+    Optimal         int     1 if the predicted hole lets food reach the bird
+    Score           int     score before a PlayerShoot
+
+Version 3 adds one column:
+
+    ScheduledTime   float   when a VibrationSent row was due; Timestamp is
+                            when it actually fired
+
+Logs written since the release of key 3 is logged also hold OpenMouth
+rows; older ones only have the CloseMouth that started each beak hold.
+
+Logs written since the game stopped logging every OptimalMoment frame hold
+OptimalWindowStart / OptimalWindowEnd rows instead: the first frame whose
+prediction is optimal and the first frame after that whose prediction is
+not, both with HoleY and PredictedHoleY. A window interrupted by a crash is
+closed on resume by an end row without them. Frames with a PlayerShoot
+inside a window were never OptimalMoments. Scripts/responses.py expands the windows
+back into OptimalMoment rows on request.
+
+Empty cells mean "not applicable". The version of a file is told apart by
+its header row (see log_version). Since the frame rate became a setting,
+the game also writes experiment_responses_X_settings.json next to the log:
+the BirdSimulation arguments (geometry, speeds, frame_rate) the session ran
+with (see write_settings / read_settings).
+
+Usage:
+    python log_schema.py Data --out Data_v3   # upgrade older logs
+"""
+import csv
+import glob
+import json
+import os
+
+SCHEMA_VERSION = 3
+
+V2_COLUMNS = ['Timestamp', 'EventCode', 'Event', 'Response', 'Intensity',
+              'HoleY', 'PredictedHoleY', 'Optimal', 'Score']
+COLUMNS = V2_COLUMNS + ['ScheduledTime']
+LEGACY_COLUMNS = ['Timestamp', 'Response', 'Intensity', 'Experiment']
+
+EVENT_CODES = {
+    'Staircase Procedure': 1,
+    'VibrationSent': 2,
+    'FootPedalPress': 3,
+    'PlayerShoot': 4,
+    'CloseMouth': 5,
+    'ComputerShoot': 6,
+    'OptimalMoment': 7,
+    'OptimalWindowStart': 8,
+    'OptimalWindowEnd': 9,
+    'OpenMouth': 10,
+}
+EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+
+# Packed version 1 field names and the column each one moves to
+LEGACY_FIELDS = {
+    'current_hole_y': 'HoleY',
+    'predicted_hole_y': 'PredictedHoleY',
+    'optimal': 'Optimal',
+}
+
+
+def make_row(event, timestamp, response=None, intensity=None, hole_y=None,
+             predicted_hole_y=None, optimal=None, score=None, scheduled_time=None):
+    """Builds one row of the current version; None is written as an empty cell."""
+    return [timestamp, EVENT_CODES[event], event, response, intensity,
+            hole_y, predicted_hole_y, None if optimal is None else int(optimal), score,
+            scheduled_time]
+
+
+def settings_path(csv_filename):
+    """experiment_responses_X.csv -> experiment_responses_X_settings.json"""
+    return os.path.splitext(csv_filename)[0] + "_settings.json"
+
+
+def write_settings(csv_filename, settings):
+    """Writes the game settings of a session next to its log."""
+    with open(settings_path(csv_filename), 'w') as file:
+        json.dump(settings, file, indent=2, sort_keys=True)
+
+
+def read_settings(csv_filename):
+    """The game settings written next to a log, or None for logs without them."""
+    try:
+        with open(settings_path(csv_filename)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def log_version(header):
+    """Schema version of a log from its header row, or None if unknown."""
+    if header[:len(COLUMNS)] == COLUMNS:
+        return SCHEMA_VERSION
+    if header[:len(V2_COLUMNS)] == V2_COLUMNS:
+        return 2
+    if header[:len(LEGACY_COLUMNS)] == LEGACY_COLUMNS:
+        return 1
+    return None
+
+
+def upgrade_record(record, version):
+    """Converts a record of a log of `version` to a current row, or None if
+    the record has no event."""
+    if version == 1:
+        return upgrade_row(record)
+    if not record:
+        return None
+    return [cell if cell != '' else None for cell in record] + [None] * (len(COLUMNS) - len(record))
+
+
+def upgrade_row(record):
+    """Converts one version 1 record to a current row, or None if the
+    record has no event (blank lines, truncated rows)."""
+    if len(record) < 4 or not record[3].strip():
+        return None
+    parts = [part.strip() for part in record[3].split(';') if part.strip()]
+    event = parts[0]
+    fields = {}
+    for part in parts[1:]:
+        key, _, value = part.partition('=')
+        if key in LEGACY_FIELDS:
+            fields[LEGACY_FIELDS[key]] = value
+
+    response = record[1].strip()
+    score = None
+    if len(record) > 4 and record[4].strip().startswith('Score='):
+        score = int(float(record[4].strip().rstrip(';').split('=')[1]))
+
+    return make_row(
+        event,
+        float(record[0]),
+        response=int(response) if response in ('0', '1') else None,
+        intensity=float(record[2]) if record[2].strip() else None,
+        hole_y=float(fields['HoleY']) if 'HoleY' in fields else None,
+        predicted_hole_y=float(fields['PredictedHoleY']) if 'PredictedHoleY' in fields else None,
+        optimal=fields['Optimal'] == 'True' if 'Optimal' in fields else None,
+        score=score,
+    )
+
+
+def read_events(file_path):
+    """Yields the rows of a log of any version as typed dicts: timestamp,
+    code, event, response, intensity, hole_y, predicted_hole_y, optimal,
+    score and scheduled_time (None where empty)."""
+    with open(file_path, newline='') as file:
+        reader = csv.reader(file)
+        version = log_version(next(reader, []))
+        if version is None:
+            raise ValueError(f"{file_path}: not an experiment_responses log")
+        for record in reader:
+            row = upgrade_record(record, version)
+            if row is None:
+                continue
+            yield {
+                'timestamp': float(row[0]),
+                'code': int(row[1]),
+                'event': row[2],
+                'response': _number(row[3], int),
+                'intensity': _number(row[4], float),
+                'hole_y': _number(row[5], float),
+                'predicted_hole_y': _number(row[6], float),
+                'optimal': None if row[7] is None else bool(int(row[7])),
+                'score': _number(row[8], int),
+                'scheduled_time': _number(row[9], float),
+            }
+
+
+def _number(value, kind):
+    if value is None:
+        return None
+    return kind(float(value)) if kind is int else kind(value)
+
+
+def convert_file(src, dst):
+    """Upgrades an older log to the current version. Returns the number of rows."""
+    count = 0
+    with open(src, newline='') as infile, open(dst, mode='w', newline='') as outfile:
+        reader = csv.reader(infile)
+        version = log_version(next(reader, []))
+        if version is None or version == SCHEMA_VERSION:
+            raise ValueError(f"{src}: expected an older log, found version {version}")
+        writer = csv.writer(outfile)
+        writer.writerow(COLUMNS)
+        for record in reader:
+            row = upgrade_record(record, version)
+            if row is not None:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upgrade experiment_responses logs to the typed schema.")
+    parser.add_argument('folder', help="folder with older experiment_responses_*.csv files")
+    parser.add_argument('--out', required=True, help="folder for the upgraded logs")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for src in sorted(glob.glob(os.path.join(args.folder, "experiment_responses_*.csv"))):
+        dst = os.path.join(args.out, os.path.basename(src))
+        print(f"{src} -> {dst}: {convert_file(src, dst)} rows")
@@ -0,0 +1,185 @@
+"""Adaptive threshold estimation for the vibration calibration.
+
+Every method answers the same three questions trial by trial: which
+intensity to present next, what the response says, and whether the
+threshold is known well enough to stop.
+
+    updown  the original 1-up/1-down staircase, threshold = mean of the
+            last reversals
+    quest   QUEST (Watson & Pelli, 1983; posterior mean placement as in
+            King-Smith et al., 1994): Bayesian posterior over the threshold
+            with the slope assumed
+    psi     Psi (Kontsevich & Tyler, 1999): joint posterior over threshold
+            and slope; each intensity is the one with the lowest expected
+            posterior entropy
+
+The Bayesian methods precompute the likelihood of a "felt it" response for
+every (intensity, threshold[, slope]) on their grids once, so an update is
+one multiply-and-normalise and a Psi choice one tensor contraction. They
+stop early once the posterior SD of the threshold falls below `target_sd`.
+
+Psychometric function (intensity units, as sent to the Arduino):
+
+    p(yes | x) = guess + (1 - guess - lapse) / (1 + exp(-(x - threshold) / slope))
+"""
+import numpy as np
+
+MIN_INTENSITY = 2
+MAX_INTENSITY = 20
+STIMULUS_STEP = 1      # resolution of the intensities presented
+GRID_STEP = 0.05       # resolution of the threshold posterior
+SLOPE = 1.0            # slope QUEST assumes
+SLOPES = np.geomspace(0.2, 5, 25)  # slopes Psi considers
+GUESS = 0.02           # false "yes" rate
+LAPSE = 0.03           # missed clearly felt vibrations
+TARGET_SD = 0.75       # stop when the threshold's posterior SD is below this
+MIN_TRIALS = 8         # ... but never before this many trials
+
+
+def psychometric(x, threshold, slope, guess=GUESS, lapse=LAPSE):
+    return guess + (1 - guess - lapse) / (1 + np.exp(-(x - threshold) / slope))
+
+
+class UpDownStaircase:
+    """The fixed-step 1-up/1-down staircase used before the Bayesian methods."""
+
+    def __init__(self, trials=20, initial=MIN_INTENSITY, min_intensity=MIN_INTENSITY,
+                 max_intensity=MAX_INTENSITY, step=STIMULUS_STEP, reversal_limit=10):
+        self.trials = trials
+        self.intensity = initial
+        self.min_intensity = min_intensity
+        self.max_intensity = max_intensity
+        self.step = step
+        self.reversal_limit = reversal_limit
+        self.reversals = []
+        self.previous_direction = None
+        self.trial_count = 0
+
+    def next_intensity(self):
+        return self.intensity
+
+    def update(self, intensity, response):
+        self.trial_count += 1
+        if response:
+            new_intensity = max(self.min_intensity, intensity - self.step)
+            direction = "down"
+        else:
+            new_intensity = min(self.max_intensity, intensity + self.step)
+            direction = "up"
+        if self.previous_direction and direction != self.previous_direction:
+            self.reversals.append(intensity)
+        self.previous_direction = direction
+        self.intensity = new_intensity
+
+    def done(self):
+        return self.trial_count >= self.trials
+
+    def threshold(self):
+        if len(self.reversals) >= self.reversal_limit:
+            return sum(self.reversals[-self.reversal_limit:]) / self.reversal_limit
+        if self.reversals:
+            return sum(self.reversals) / len(self.reversals)
+        return self.intensity
+
+
+class _BayesianMethod:
+    """Posterior bookkeeping shared by QUEST and Psi.
+
+    Subclasses set `self.likelihood` (P(yes) with the stimulus index on axis
+    0 and the parameter grid after it) and `self.posterior` (the grid).
+    """
+
+    def __init__(self, trials, min_intensity, max_intensity, step, target_sd, min_trials):
+        self.trials = trials
+        self.target_sd = target_sd
+        self.min_trials = min_trials
+        # Integer steps give integer intensities, as the staircase always sent
+        stimuli = np.arange(min_intensity, max_intensity + step, step)
+        self.stimuli = stimuli[stimuli <= max_intensity + 1e-9]
+        self.thresholds = np.arange(min_intensity - 1, max_intensity + 1 + GRID_STEP / 2, GRID_STEP)
+        self.trial_count = 0
+
+    def update(self, intensity, response):
+        index = int(np.argmin(np.abs(self.stimuli - intensity)))
+        p_yes = self.likelihood[index]
+        self.posterior = self.posterior * (p_yes if response else 1 - p_yes)
+        self.posterior /= self.posterior.sum()
+        self.trial_count += 1
+
+    def threshold_posterior(self):
+        posterior = self.posterior
+        while posterior.ndim > 1:
+            posterior = posterior.sum(axis=-1)
+        return posterior
+
+    def threshold(self):
+        return float(self.threshold_posterior() @ self.thresholds)
+
+    def threshold_sd(self):
+        marginal = self.threshold_posterior()
+        mean = marginal @ self.thresholds
+        return float(np.sqrt(marginal @ (self.thresholds - mean) ** 2))
+
+    def done(self):
+        if self.trial_count >= self.trials:
+            return True
+        return self.trial_count >= self.min_trials and self.threshold_sd() < self.target_sd
+
+
+class Quest(_BayesianMethod):
+    """QUEST with a flat prior over the threshold and a fixed slope."""
+
+    def __init__(self, trials=20, min_intensity=MIN_INTENSITY, max_intensity=MAX_INTENSITY,
+                 step=STIMULUS_STEP, slope=SLOPE, target_sd=TARGET_SD, min_trials=MIN_TRIALS):
+        super().__init__(trials, min_intensity, max_intensity, step, target_sd, min_trials)
+        self.likelihood = psychometric(self.stimuli[:, None], self.thresholds[None, :], slope)
+        self.posterior = np.full(len(self.thresholds), 1 / len(self.thresholds))
+
+    def next_intensity(self):
+        """The presentable intensity nearest the posterior mean."""
+        index = int(np.argmin(np.abs(self.stimuli - self.threshold())))
+        return self.stimuli[index].item()
+
+
+class Psi(_BayesianMethod):
+    """Psi over a threshold x slope grid with flat priors."""
+
+    def __init__(self, trials=20, min_intensity=MIN_INTENSITY, max_intensity=MAX_INTENSITY,
+                 step=STIMULUS_STEP, slopes=SLOPES, target_sd=TARGET_SD, min_trials=MIN_TRIALS):
+        super().__init__(trials, min_intensity, max_intensity, step, target_sd, min_trials)
+        self.slopes = np.asarray(slopes)
+        self.likelihood = psychometric(self.stimuli[:, None, None], self.thresholds[None, :, None],
+                                       self.slopes[None, None, :])
+        self.posterior = np.full((len(self.thresholds), len(self.slopes)),
+                                 1 / (len(self.thresholds) * len(self.slopes)))
+
+    def next_intensity(self):
+        """The intensity whose response is expected to leave the least
+        posterior entropy."""
+        joint_yes = self.likelihood * self.posterior            # (stimulus, threshold, slope)
+        joint_no = self.posterior - joint_yes
+        p_yes = joint_yes.sum(axis=(1, 2))
+        expected_entropy = (_entropy(joint_yes, p_yes) * p_yes +
+                            _entropy(joint_no, 1 - p_yes) * (1 - p_yes))
+        return self.stimuli[int(np.argmin(expected_entropy))].item()
+
+
+def _entropy(joint, total):
+    """Entropy of each stimulus' posterior given the joint P(response, params)."""
+    posterior = joint / total[:, None, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(posterior > 0, posterior * np.log(posterior), 0.0)
+    return -terms.sum(axis=(1, 2))
+
+
+METHODS = {'updown': UpDownStaircase, 'quest': Quest, 'psi': Psi}
+
+
+def make_method(name, trials=20, initial=MIN_INTENSITY, min_intensity=MIN_INTENSITY,
+                max_intensity=MAX_INTENSITY, step=STIMULUS_STEP):
+    """Creates the method called `name` ('updown', 'quest' or 'psi')."""
+    if name not in METHODS:
+        raise ValueError(f"unknown staircase method {name!r}, expected one of {', '.join(METHODS)}")
+    if name == 'updown':
+        return UpDownStaircase(trials, initial, min_intensity, max_intensity, step)
+    return METHODS[name](trials, min_intensity, max_intensity, step)
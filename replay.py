@@ -0,0 +1,426 @@
+"""Replay recorded experiment_responses logs through the game logic.
+
+Each logged session is fed back into `bird_sim.BirdSimulation` headless. The
+frame clock is rebuilt from the logged hole positions: between two logged
+events the replay steps as many frames as fit the elapsed time, choosing the
+count that puts the hole where the log says it was. The simulation is built
+from the settings written next to the log (bird_game.ini for older logs).
+Player shots and mouth closes and opens are re-applied on their frames, and the re-derived hole position,
+score, optimal flags and OptimalMoment windows are checked against the log,
+whether it holds every OptimalMoment frame or only the window edges.
+
+Usage:
+    python replay.py                     # every subject in Data/
+    python replay.py Data/experiment_responses_Subject3.csv --out rederived
+"""
+import csv
+import glob
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bird_sim import BirdSimulation, CONFIG_FILE, FRAME_MS, SimEvent, game_settings
+from log_schema import COLUMNS as LOG_COLUMNS, make_row, read_events, read_settings
+
+# Older logs have no OpenMouth rows, so the beak is assumed to reopen after
+# this; their scores are reported as unverifiable
+MOUTH_HOLD_MS = 150
+# Frames are never more than this far apart inside one OptimalMoment run
+OPTIMAL_GAP_MS = 100
+HOLE_TOLERANCE = 0.01
+
+INPUT_EVENTS = ('FootPedalPress', 'PlayerShoot', 'CloseMouth', 'OpenMouth')
+# Fired by the vibration scheduler between frames, so they say nothing about
+# the frame clock and are passed through as they are
+PASSTHROUGH_EVENTS = ('VibrationSent',)
+WINDOW_EVENTS = ('OptimalWindowStart', 'OptimalWindowEnd')
+OUTPUT_EVENTS = ('ComputerShoot', 'OptimalMoment') + WINDOW_EVENTS
+
+
+def parse_log(file_path):
+    """Reads the game rows of a response log (any schema version) as
+    log_schema.read_events dicts, in file order. Staircase rows are skipped."""
+    return [row for row in read_events(file_path) if row['event'] != "Staircase Procedure"]
+
+
+def estimate_frame_ms(rows, default=FRAME_MS):
+    """Median frame duration, taken from consecutive OptimalMoment rows, or
+    `default` (the frame time the game was set to) if there are none."""
+    times = [row['timestamp'] for row in rows if row['event'] == 'OptimalMoment']
+    gaps = [b - a for a, b in zip(times, times[1:]) if b - a < OPTIMAL_GAP_MS]
+    return statistics.median(gaps) if gaps else default
+
+
+class ReplayReport:
+    """Counts of what the replay re-derived and how it compares to the log."""
+
+    def __init__(self, subject):
+        self.subject = subject
+        self.rows = 0
+        self.frames = 0
+        self.frame_ms = 0.0
+        self.hole_checked = 0
+        self.hole_mismatches = 0
+        self.score_checked = 0
+        self.score_mismatches = 0
+        self.score_verifiable = True  # False when the beak opens had to be guessed
+        self.first_score_mismatch = None
+        self.optimal_flag_mismatches = 0
+        self.shots_rejected = 0
+        self.optimal_logged = 0
+        self.optimal_matched = 0
+        self.optimal_rederived = 0
+        self.optimal_windows = 0
+        self.computer_logged = 0
+        self.computer_matched = 0
+        self.edges_logged = 0
+        self.edges_matched = 0
+        self.vibrations_logged = 0
+        self.vibrations_rederived = 0
+        self.level_resyncs = 0
+        self.hole_resyncs = 0
+        self.final_level = 1
+        self.final_score = 0
+        self.logged_final_score = None
+        self.seconds = 0.0
+
+    def summary(self):
+        return (f"{self.subject}: {self.rows} rows, {self.frames} frames @ {self.frame_ms:.1f} ms | "
+                f"hole {self.hole_checked - self.hole_mismatches}/{self.hole_checked} | "
+                f"{self._score_summary()} | "
+                f"OptimalMoment {self.optimal_matched}/{self.optimal_logged} "
+                f"(re-derived {self.optimal_rederived} in {self.optimal_windows} windows) | "
+                f"ComputerShoot {self.computer_matched}/{self.computer_logged} | "
+                f"window edges {self.edges_matched}/{self.edges_logged} | "
+                f"{self.hole_resyncs} hole resyncs | "
+                f"level {self.final_level}, score {self.final_score} (logged {self.logged_final_score}) | "
+                f"{self.seconds:.2f} s")
+
+    def _score_summary(self):
+        if not self.score_verifiable:
+            return f"score unverifiable ({self.score_checked} shots, no OpenMouth rows)"
+        return f"score {self.score_checked - self.score_mismatches}/{self.score_checked}"
+
+
+class SessionReplay:
+    """Steps a simulation through one recorded session."""
+
+    def __init__(self, rows, subject='', mouth_hold_ms=MOUTH_HOLD_MS, resync_score=False, sim=None):
+        self.rows = rows
+        self.mouth_hold_ms = mouth_hold_ms
+        self.resync_score = resync_score
+        self.sim = sim or BirdSimulation()
+        self.frame_ms = estimate_frame_ms(rows, self.sim.frame_ms)
+        self.report = ReplayReport(subject)
+        self.report.rows = len(rows)
+        self.report.frame_ms = self.frame_ms
+        events = {row['event'] for row in rows}
+        self.opens_logged = 'OpenMouth' in events
+        self.report.score_verifiable = self.opens_logged or 'CloseMouth' not in events
+        self.events = []  # re-derived (SimEvent, intensity) pairs
+
+        self._frame_open = None      # timestamp of the frame collecting input
+        self._last_frame_time = None
+        self._last_frame_kinds = set()
+        self._mouth_reopen_at = None
+        self._optimal_ticks = []
+        self._intensity = None
+
+    def run(self):
+        start = time.perf_counter()
+        for row in self.rows:
+            self._intensity = row['intensity'] if row['intensity'] is not None else self._intensity
+            if row['event'] in INPUT_EVENTS:
+                self._input_row(row)
+            elif row['event'] in OUTPUT_EVENTS:
+                self._output_row(row)
+            elif row['event'] in PASSTHROUGH_EVENTS:
+                self.report.vibrations_logged += 1
+                self.events.append((_passthrough(row), self._intensity))
+        if self._frame_open is not None:
+            self._advance(self._frame_open)
+
+        report = self.report
+        report.frames = self.sim.tick_count
+        report.optimal_rederived = len(self._optimal_ticks)
+        report.optimal_windows = sum(1 for a, b in zip([None] + self._optimal_ticks, self._optimal_ticks)
+                                     if a is None or b - a > 1)
+        report.final_level = self.sim.current_level
+        report.final_score = self.sim.score
+        scores = [row['score'] for row in self.rows if row['score'] is not None]
+        report.logged_final_score = scores[-1] if scores else None
+        report.seconds = time.perf_counter() - start
+        return report
+
+    # --- Frame clock ------------------------------------------------------
+
+    def _advance(self, timestamp):
+        sim = self.sim
+        if self._mouth_reopen_at is not None and timestamp >= self._mouth_reopen_at:
+            sim.open_mouth(self._mouth_reopen_at)
+            self._mouth_reopen_at = None
+        events = sim.advance(timestamp)
+        self._last_frame_kinds = set()
+        for event in events:
+            self.events.append((event, self._intensity))
+            self._last_frame_kinds.add(event.kind)
+            if event.kind == 'OptimalMoment':
+                self._optimal_ticks.append(sim.tick_count)
+        self._last_frame_time = timestamp
+        self._frame_open = None
+
+    def _open_frame(self, timestamp):
+        self._frame_open = timestamp
+        due = self.sim.pop_due_vibration(timestamp)
+        if due is not None:
+            self.report.vibrations_rederived += 1
+
+    def _skip_frames(self, count, until):
+        """Advance `count` frames with no input, spread evenly before `until`."""
+        if count <= 0:
+            return
+        since = self._last_frame_time if self._last_frame_time is not None else until - count * self.frame_ms
+        step = (until - since) / (count + 1)
+        for i in range(1, count + 1):
+            self._advance(since + i * step)
+
+    def _frames_to(self, timestamp, matches, offset):
+        """Number of empty frames to step before `timestamp`.
+
+        `matches(hole_y, hit_bottom)` tests the hole state after
+        (empty frames + offset) advances against the logged row. The count
+        closest to the elapsed-time estimate wins; if no count fits at the
+        current level the other levels are tried before giving up.
+        """
+        if self._last_frame_time is None:
+            estimate, window = 0, 120
+        else:
+            estimate = max(0, round((timestamp - self._last_frame_time) / self.frame_ms) - 1)
+            window = max(3, estimate // 4)
+        low = max(0, estimate - window)
+        high = estimate + window
+
+        found = self._search(matches, offset, low, high, estimate)
+        if found is not None:
+            return found
+
+        level = self.sim.current_level
+        for other in (1, 2, 3):
+            if other == level:
+                continue
+            self.sim.set_level(other)
+            found = self._search(matches, offset, low, high, estimate)
+            if found is not None:
+                self.report.level_resyncs += 1
+                return found
+        self.sim.set_level(level)
+        self.report.hole_mismatches += 1
+        return estimate
+
+    def _search(self, matches, offset, low, high, estimate):
+        path = [(self.sim.hole_y, False)] + self.sim.project_hole(high + offset)
+        candidates = [n for n in range(low, high + 1) if n + offset < len(path) and matches(*path[n + offset])]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda n: abs(n - estimate))
+
+    # --- Logged rows ------------------------------------------------------
+
+    def _input_row(self, row):
+        timestamp = row['timestamp']
+        if self._frame_open != timestamp:
+            if self._frame_open is not None:
+                self._advance(self._frame_open)
+            if row['event'] == 'PlayerShoot':
+                # current_hole_y is read before this frame moves the hole
+                self.report.hole_checked += 1
+                logged = row['hole_y']
+                skip = self._frames_to(timestamp, lambda y, bottom: abs(y - logged) < HOLE_TOLERANCE, 0)
+            else:
+                skip = self._frames_to(timestamp, lambda y, bottom: True, 0)
+            self._skip_frames(skip, timestamp)
+            self._open_frame(timestamp)
+
+        sim = self.sim
+        kind = row['event']
+        if kind == 'PlayerShoot':
+            self._check_shot(row)
+            shot = sim.player_shoot(timestamp)
+            if shot is None:
+                self.report.shots_rejected += 1
+            else:
+                self.events.append((shot, self._intensity))
+                if row['optimal'] is not None and shot.data['optimal'] != row['optimal']:
+                    self.report.optimal_flag_mismatches += 1
+        elif kind == 'CloseMouth':
+            self.events.append((sim.close_mouth(timestamp), self._intensity))
+            if not self.opens_logged:
+                self._mouth_reopen_at = timestamp + self.mouth_hold_ms
+        elif kind == 'OpenMouth':
+            self.events.append((sim.open_mouth(timestamp), self._intensity))
+        elif kind == 'FootPedalPress':
+            self.events.append((_passthrough(row), self._intensity))
+
+    def _resync_hole(self, row):
+        """Puts the hole where `row` says it was, with the level and
+        direction that reproduce the logged predicted_hole_y."""
+        sim = self.sim
+        level, direction = sim.current_level, sim.hole_y_direction
+        sim.hole_y = row['hole_y']
+        for candidate in [level] + [other for other in (1, 2, 3) if other != level]:
+            if candidate != sim.current_level:
+                sim.set_level(candidate)
+            for sim.hole_y_direction in (direction, -direction):
+                if abs(sim.predict_hole_y() - row['predicted_hole_y']) < HOLE_TOLERANCE:
+                    self.report.hole_resyncs += 1
+                    return
+        sim.set_level(level)
+        sim.hole_y_direction = direction
+
+    def _check_shot(self, row):
+        sim = self.sim
+        if abs(sim.hole_y - row['hole_y']) >= HOLE_TOLERANCE:
+            self.report.hole_mismatches += 1
+            self._resync_hole(row)
+        if row['score'] is not None:
+            self.report.score_checked += 1
+            if sim.score != row['score']:
+                self.report.score_mismatches += 1
+                if self.report.first_score_mismatch is None:
+                    self.report.first_score_mismatch = row['timestamp']
+                if self.resync_score:
+                    sim.score = row['score']
+
+    def _output_row(self, row):
+        kind = row['event']
+        timestamp = row['timestamp']
+        if kind in WINDOW_EVENTS and row['hole_y'] is None:
+            return  # Closes a window interrupted by a crash, on no frame of its own
+        if kind == 'OptimalMoment' or kind in WINDOW_EVENTS:
+            if kind == 'OptimalMoment':
+                self.report.optimal_logged += 1
+            else:
+                self.report.edges_logged += 1
+            self.report.hole_checked += 1
+            logged = row['hole_y']
+            matches = lambda y, bottom: abs(y - logged) < HOLE_TOLERANCE
+        else:
+            self.report.computer_logged += 1
+            matches = lambda y, bottom: bottom
+
+        if self._frame_open is not None and timestamp - self._frame_open < self.frame_ms / 2:
+            # Logged while the frame that took this input was being advanced
+            self._advance(self._frame_open)
+        elif (self._frame_open is None and self._last_frame_time is not None
+              and timestamp - self._last_frame_time < self.frame_ms / 2
+              and kind in self._last_frame_kinds):
+            # Second output row of the frame just advanced
+            pass
+        else:
+            if self._frame_open is not None:
+                self._advance(self._frame_open)
+            skip = self._frames_to(timestamp, matches, 1)
+            self._skip_frames(skip, timestamp)
+            self._advance(timestamp)
+
+        if kind != 'ComputerShoot' and abs(self.sim.hole_y - row['hole_y']) >= HOLE_TOLERANCE:
+            self._resync_hole(row)
+        if kind in self._last_frame_kinds:
+            if kind == 'OptimalMoment':
+                self.report.optimal_matched += 1
+            elif kind in WINDOW_EVENTS:
+                self.report.edges_matched += 1
+            else:
+                self.report.computer_matched += 1
+
+
+def _passthrough(row):
+    return SimEvent(row['timestamp'], row['event'], {})
+
+
+def write_log(events, csv_filename):
+    """Writes re-derived events in the format Bird_Game.py logs them."""
+    with open(csv_filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(LOG_COLUMNS)
+        for event, intensity in events:
+            data = event.data
+            if event.kind == 'PlayerShoot':
+                writer.writerow(make_row(event.kind, event.timestamp, intensity=intensity,
+                                         hole_y=data['current_hole_y'], predicted_hole_y=data['predicted_hole_y'],
+                                         optimal=data['optimal'], score=data['score']))
+            elif event.kind in WINDOW_EVENTS:
+                writer.writerow(make_row(event.kind, event.timestamp, intensity=intensity,
+                                         hole_y=data['current_hole_y'], predicted_hole_y=data['predicted_hole_y']))
+            elif event.kind == 'FootPedalPress':
+                writer.writerow(make_row(event.kind, event.timestamp, response=1, intensity=intensity))
+            elif event.kind in ('CloseMouth', 'OpenMouth'):
+                writer.writerow(make_row(event.kind, event.timestamp))
+            elif event.kind in ('VibrationSent', 'ComputerShoot'):
+                writer.writerow(make_row(event.kind, event.timestamp, intensity=intensity))
+
+
+def replay_file(file_path, mouth_hold_ms=MOUTH_HOLD_MS, resync_score=False, out_dir=None, settings=None):
+    """Replays one response log and returns its ReplayReport. The game
+    settings come from the log's settings file; `settings` (default:
+    bird_game.ini) stand in for logs written before there was one."""
+    subject = os.path.splitext(os.path.basename(file_path))[0].replace("experiment_responses_", "")
+    logged = read_settings(file_path)
+    if logged is None:
+        logged = game_settings() if settings is None else settings
+    sim = BirdSimulation(**logged)
+    replay = SessionReplay(parse_log(file_path), subject, mouth_hold_ms, resync_score, sim)
+    report = replay.run()
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        write_log(replay.events, os.path.join(out_dir, os.path.basename(file_path)))
+    return report
+
+
+def subject_number(file_path):
+    match = re.search(r"(\d+)\.csv$", file_path)
+    return int(match.group(1)) if match else 0
+
+
+def replay_all(paths, mouth_hold_ms=MOUTH_HOLD_MS, resync_score=False, out_dir=None, jobs=None, settings=None):
+    """Replays every log in `paths` across a process pool, in subject order."""
+    paths = sorted(paths, key=subject_number)
+    if settings is None:
+        settings = game_settings()
+    args = [(path, mouth_hold_ms, resync_score, out_dir, settings) for path in paths]
+    if jobs == 1:
+        return [replay_file(*a) for a in args]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(replay_file, *zip(*args))) if args else []
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay experiment_responses logs headless.")
+    parser.add_argument('paths', nargs='*', help="log files or folders (default: Data/)")
+    parser.add_argument('--mouth-hold', type=float, default=MOUTH_HOLD_MS,
+                        help="ms the beak stays closed after a CloseMouth in logs without OpenMouth rows")
+    parser.add_argument('--resync-score', action='store_true',
+                        help="reset the score to the logged value at each PlayerShoot")
+    parser.add_argument('--out', help="folder for re-derived logs")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (1 = no pool)")
+    parser.add_argument('--config', default=CONFIG_FILE,
+                        help="bird_game.ini for logs without a settings file")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths or ["Data"]:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "experiment_responses_*.csv")))
+        else:
+            files.append(path)
+
+    start = time.perf_counter()
+    reports = replay_all(files, args.mouth_hold, args.resync_score, args.out, args.jobs,
+                         game_settings(args.config))
+    for report in reports:
+        print(report.summary())
+    print(f"Replayed {len(reports)} sessions in {time.perf_counter() - start:.2f} s")
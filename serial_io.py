@@ -0,0 +1,253 @@
+"""Single-owner serial I/O for the Arduino.
+
+One worker thread owns the `serial.Serial` object and does every read and
+write on it, so the force stream and the vibration commands never touch the
+port from two threads at once. Callers queue commands with `send_intensity`,
+which only appends to a deque (atomic under the GIL, no lock) and wakes the
+worker's pending read. A command's optional `on_written(written_ms)`
+callback is called from the worker as soon as the bytes have been handed to
+the port, so callers learn when the command actually went out rather than
+when it was queued. If the port fails, the worker stops and is marked
+`dead`; commands it can no longer write report their time of failure (or,
+queued later, of queueing) to `on_written` instead, as the game does when
+no port is connected, so no caller waits for a write that never comes.
+
+Two command formats are supported:
+
+    plain   b"3\n"                 what the current firmware expects
+    framed  b"!V,12,3*66\n"        command 'V', sequence number, intensity,
+                                   XOR checksum of the text between '!' and
+                                   '*' as two hex digits
+
+Firmware that understands framed commands answers each one with
+b"!A,12*<checksum>\n"; the worker matches acknowledgements to sequence
+numbers so the command round trip can be measured. Force samples stay plain
+numeric lines in both modes.
+
+SerialConnector finds and opens the port on a background thread, so the
+game's first screens are up while the board enumerates and resets.
+"""
+import threading
+import time
+from collections import deque
+
+import serial
+from serial.tools import list_ports
+
+from force_reader import parse_lines
+
+READ_TIMEOUT = 0.05  # seconds a read waits for data when nothing is queued
+RESET_DELAY = 2.0    # seconds an Arduino needs after opening the port resets it
+# Substrings of a port's description or manufacturer that mark an Arduino
+ARDUINO_HINTS = ('arduino', 'ch340', 'ch910', 'cp210', 'ftdi', 'usb serial', 'usb-serial')
+
+
+def checksum(body):
+    value = 0
+    for char in body.encode():
+        value ^= char
+    return value
+
+
+def encode_command(seq, intensity):
+    """Frames a vibration command."""
+    body = f"V,{seq},{intensity}"
+    return f"!{body}*{checksum(body):02X}\n".encode()
+
+
+def decode_frame(line):
+    """Returns the comma-separated fields of a framed line, or None if the
+    line is malformed or its checksum does not match."""
+    text = line.decode('ascii', errors='replace').strip()
+    if not text.startswith('!') or '*' not in text:
+        return None
+    body, _, check = text[1:].rpartition('*')
+    try:
+        if int(check, 16) != checksum(body):
+            return None
+    except ValueError:
+        return None
+    return body.split(',')
+
+
+def find_arduino_port():
+    """Device name of the first port that looks like an Arduino, else of the
+    first USB serial port, else None."""
+    ports = sorted(list_ports.comports(), key=lambda port: port.device)
+    for port in ports:
+        text = f"{port.description} {port.manufacturer or ''}".lower()
+        if any(hint in text for hint in ARDUINO_HINTS):
+            return port.device
+    for port in ports:
+        if port.vid is not None:
+            return port.device
+    return None
+
+
+class SerialConnector:
+    """Opens the Arduino's port on a background thread.
+
+    `port` is a device name or 'auto' to search for the board. `wait()`
+    returns the open `serial.Serial`, or None if no board could be opened.
+    """
+
+    def __init__(self, port='auto', baud_rate=115200, reset_delay=RESET_DELAY):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.reset_delay = reset_delay
+        self.ser = None
+        self.error = None
+        self._thread = threading.Thread(target=self._connect, name="serial-connect", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.ser
+
+    def _connect(self):
+        port = find_arduino_port() if self.port == 'auto' else self.port
+        if port is None:
+            self.error = "no serial port found"
+            return
+        try:
+            ser = serial.Serial(port, self.baud_rate, timeout=1)
+        except (serial.SerialException, OSError) as e:
+            self.error = str(e)
+            return
+        self.port = port
+        # Opening the port resets the board; let it boot before talking to it
+        time.sleep(self.reset_delay)
+        ser.reset_input_buffer()
+        self.ser = ser
+
+
+def spread_times(since, until, count):
+    """`count` evenly spaced times after `since`, the last one at `until`."""
+    step = (until - since) / count
+    return [until - step * (count - 1 - i) for i in range(count)]
+
+
+class SerialWorker:
+    """Owns `ser`: writes queued commands and reads the force stream.
+
+    Parsed force samples are passed to `on_samples(timestamps, values)`.
+    A read can bring several samples at once; they are spread evenly over
+    the time since the previous read that brought samples, so each one has
+    its own timestamp, in order, the last at the arrival of the read.
+    """
+
+    def __init__(self, ser, on_samples=None, framed=False, read_timeout=READ_TIMEOUT):
+        self.ser = ser
+        self.on_samples = on_samples
+        self.framed = framed
+        self.read_timeout = read_timeout
+        self.bad_lines = 0
+        self.bad_frames = 0
+        self.commands_sent = 0
+        self.dead = False  # set when the port failed and the worker stopped
+        self.ack_latencies = []  # write-to-acknowledgement times (ms)
+        self._sent_at = {}       # seq -> time the command was written (ms)
+        self._commands = deque()
+        self._seq = 0
+        self._last_arrival = None  # arrival (ms) of the previous samples
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="serial-io", daemon=True)
+
+    def start(self):
+        self.ser.timeout = self.read_timeout
+        self._last_arrival = time.time() * 1000
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        """Writes commands still queued, then stops the worker."""
+        self._running = False
+        self._wake()
+        self._thread.join()
+        if self.framed:
+            print(f"Serial I/O stopped: {len(self.ack_latencies)}/{self.commands_sent} commands acknowledged, "
+                  f"{self.bad_frames} bad frames, {self.bad_lines} unparsed lines.")
+        else:
+            print(f"Serial I/O stopped: {self.commands_sent} commands sent, {self.bad_lines} unparsed lines.")
+
+    def send_intensity(self, intensity, on_written=None):
+        """Queues a vibration command and returns its sequence number.
+        `on_written(written_ms)` is called from the worker once it is written."""
+        self._seq = (self._seq + 1) % 256
+        seq = self._seq
+        frame = encode_command(seq, intensity) if self.framed else f"{intensity}\n".encode()
+        self._commands.append((seq, frame, on_written))
+        if self.dead:
+            self._drop_commands()
+        else:
+            self._wake()
+        return seq
+
+    def _drop_commands(self):
+        """Empties the queue of a dead worker, reporting each command as
+        written now. Safe to run from both threads at once."""
+        while True:
+            try:
+                seq, frame, on_written = self._commands.popleft()
+            except IndexError:
+                return
+            if on_written:
+                on_written(time.time() * 1000)
+
+    def _wake(self):
+        # Interrupt a read that is waiting for data, where pyserial supports it
+        cancel_read = getattr(self.ser, 'cancel_read', None)
+        if cancel_read:
+            try:
+                cancel_read()
+            except (serial.SerialException, OSError):
+                pass
+
+    def _run(self):
+        ser = self.ser
+        rest = b''
+        while True:
+            try:
+                while self._commands:
+                    # Dequeued only once written, so a failed write is dropped below
+                    seq, frame, on_written = self._commands[0]
+                    ser.write(frame)
+                    self._commands.popleft()
+                    written = time.time() * 1000
+                    self._sent_at[seq] = written
+                    self.commands_sent += 1
+                    if on_written:
+                        on_written(written)
+                if not self._running:
+                    break
+                waiting = ser.in_waiting
+                chunk = ser.read(waiting if waiting else 1)
+            except (serial.SerialException, OSError) as e:
+                print(f"SerialException: {e}. Exiting thread.")
+                self.dead = True
+                self._drop_commands()
+                break
+            if not chunk:
+                continue
+
+            arrival = time.time() * 1000
+            values, frames, rest, bad = parse_lines(rest + chunk)
+            self.bad_lines += bad
+            if values:
+                if self.on_samples:
+                    self.on_samples(spread_times(self._last_arrival, arrival, len(values)), values)
+                self._last_arrival = arrival
+            for frame in frames:
+                fields = decode_frame(frame)
+                if fields is None:
+                    self.bad_frames += 1
+                elif fields[0] == 'A' and len(fields) > 1 and fields[1].isdigit():
+                    sent_at = self._sent_at.pop(int(fields[1]), None)
+                    if sent_at is not None:
+                        self.ack_latencies.append(arrival - sent_at)
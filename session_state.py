@@ -0,0 +1,214 @@
+"""Session state snapshots and crash resume.
+
+SessionState is the compact, `__slots__` record of everything needed to
+pick an interrupted session up again: which log it writes to, the threshold
+found by the staircase, and the game's level, score and progress. The game
+loop copies the simulation into it every frame (a few attribute stores)
+and hands it to a Checkpointer, which only swaps in a reference. The
+checkpointer's own thread wakes once a second and appends the fields that
+changed since its last write to a JSON-lines journal, then fsyncs. The first
+line of the journal is a full snapshot; the journal is rewritten as one
+snapshot every COMPACT_EVERY lines. No file I/O or serialisation happens on
+the game loop's thread.
+
+Loading replays the journal line by line and ignores a last line cut off
+by a crash. On resume the response log is cut back to the rows logged when
+the checkpoint was taken, as the game picks up from that point; a session
+the subject chooses not to resume is marked abandoned and not offered again.
+"""
+import glob
+import json
+import os
+import re
+import threading
+
+CHECKPOINT_INTERVAL = 1.0  # seconds between journal writes
+COMPACT_EVERY = 600        # journal lines before it is rewritten as one snapshot
+
+PHASE_STAIRCASE = 'staircase'
+PHASE_GAME = 'game'
+PHASE_DONE = 'done'
+PHASE_ABANDONED = 'abandoned'
+
+
+class SessionState:
+    __slots__ = ('subject', 'csv_filename', 'phase', 'threshold', 'level', 'score', 'foods_fed',
+                 'current_trial', 'remaining_player_shots', 'remaining_computer_shots',
+                 'hole_y', 'hole_y_direction', 'in_optimal_window', 'frames', 'log_rows')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, self.values()))
+
+    def capture(self, sim, log_rows=None):
+        """Copies the game's progress out of `sim` (a BirdSimulation)."""
+        self.level = sim.current_level
+        self.score = sim.score
+        self.foods_fed = sim.foods_fed
+        self.current_trial = sim.current_trial
+        self.remaining_player_shots = sim.remaining_player_shots
+        self.remaining_computer_shots = sim.remaining_computer_shots
+        self.hole_y = sim.hole_y
+        self.hole_y_direction = sim.hole_y_direction
+        self.in_optimal_window = sim.in_optimal_window
+        self.frames = sim.tick_count
+        if log_rows is not None:
+            self.log_rows = log_rows
+
+    def restore(self, sim):
+        """Puts the captured progress back into a fresh simulation. Foods in
+        flight and the shot rhythm behind the vibration timing start over."""
+        if self.level is None:
+            return
+        sim.set_level(self.level)
+        sim.score = self.score
+        sim.foods_fed = self.foods_fed
+        sim.current_trial = self.current_trial
+        sim.remaining_player_shots = self.remaining_player_shots
+        sim.remaining_computer_shots = self.remaining_computer_shots
+        sim.hole_y = self.hole_y
+        sim.hole_y_direction = self.hole_y_direction
+        sim.in_optimal_window = bool(self.in_optimal_window)
+
+
+def checkpoint_path(csv_filename):
+    """experiment_responses_X.csv -> experiment_responses_X.checkpoint"""
+    return os.path.splitext(csv_filename)[0] + ".checkpoint"
+
+
+class Checkpointer:
+    """Journals the latest submitted SessionState from a background thread."""
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.interval = interval
+        self.compact_every = compact_every
+        self.writes = 0
+        self._latest = None   # values() tuple of the newest state
+        self._written = None  # values() tuple last written to the journal
+        self._lines = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, state):
+        """Records the state to write next. Cheap enough to call every frame."""
+        self._latest = state.values()
+
+    def stop(self):
+        """Writes the last submitted state and stops the thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.interval)
+            latest = self._latest
+            if latest is not None and latest != self._written:
+                self._write(latest)
+            if stopping:
+                return
+
+    def _write(self, values):
+        if self._written is None or self._lines >= self.compact_every:
+            # Full snapshot, swapped in atomically
+            tmp = self.path + ".tmp"
+            with open(tmp, mode='w') as file:
+                file.write(json.dumps(dict(zip(SessionState.__slots__, values))) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp, self.path)
+            self._lines = 1
+        else:
+            changed = {name: new for name, old, new in zip(SessionState.__slots__, self._written, values)
+                       if new != old}
+            with open(self.path, mode='a') as file:
+                file.write(json.dumps(changed) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self._lines += 1
+        self._written = values
+        self.writes += 1
+
+
+def load_checkpoint(path):
+    """The SessionState journalled in `path`, or None if there is none."""
+    values = {}
+    try:
+        with open(path) as file:
+            for line in file:
+                try:
+                    values.update(json.loads(line))
+                except ValueError:
+                    break  # Torn last line
+    except OSError:
+        return None
+    return SessionState(**values) if values else None
+
+
+def find_resumable(sanitized_name):
+    """Checkpoint path of the newest unfinished session of a subject, or None."""
+    base = f"experiment_responses_{sanitized_name}"
+    paths = [path for path in glob.glob(glob.escape(base) + "*.checkpoint")
+             if re.fullmatch(re.escape(base) + r"(_\d+)?\.checkpoint", os.path.basename(path))]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        state = load_checkpoint(path)
+        if state and state.phase not in (PHASE_DONE, PHASE_ABANDONED) and os.path.exists(state.csv_filename or ''):
+            return path
+    return None
+
+
+def abandon_checkpoint(path):
+    """Marks the session of a checkpoint as not to be resumed."""
+    with open(path, mode='a') as file:
+        file.write(json.dumps({'phase': PHASE_ABANDONED}) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def repair_log(csv_filename):
+    """Cuts a row left half-written by a crash off the end of the log and
+    returns the number of complete rows (header included)."""
+    with open(csv_filename, 'rb+') as file:
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            file.truncate(end)
+    return data.count(b'\n', 0, end)
+
+
+def last_timestamp(csv_filename):
+    """Timestamp of the last row of a log, or None if it has none."""
+    with open(csv_filename, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        file.seek(max(0, file.tell() - 4096))
+        tail = file.read()
+    for line in reversed(tail.splitlines()):
+        try:
+            return float(line.split(b',', 1)[0])
+        except ValueError:
+            continue
+    return None
+
+
+def truncate_log(csv_filename, rows):
+    """Cuts the log back to its first `rows` lines (header included), dropping
+    rows logged after the checkpoint. Returns the number of lines kept."""
+    with open(csv_filename, 'rb+') as file:
+        data = file.read()
+        end = 0
+        for kept in range(rows):
+            newline = data.find(b'\n', end)
+            if newline < 0:
+                return kept
+            end = newline + 1
+        file.truncate(end)
+    return rows
@@ -0,0 +1,297 @@
+"""Synthetic participants for power analysis.
+
+Each session runs a model participant through the staircase and the game,
+headless on `bird_sim.BirdSimulation`, and writes an
+experiment_responses_SubjectN.csv in exactly the format Bird_Game.py logs,
+so the scripts in Scripts/ analyse it like a recorded session.
+
+The model participant:
+  - detects a vibration with a logistic psychometric function around their
+    threshold, shifted when the vibration falls in the preparation window
+    of their next shot or inside an optimal window (the effects the
+    analyses look for), plus lapses and false alarms;
+  - answers detected vibrations with the foot pedal after a normally
+    distributed reaction time, and presses spontaneously at a Poisson rate;
+  - shoots with a jittered rhythm, waiting for an optimal window with some
+    probability, and closes the beak against some computer shots.
+
+Sessions run across a process pool. Every session gets its own seed derived
+from the batch seed and its subject number, so a batch reproduces exactly
+whatever the number of workers. Workers write their logs straight to disk;
+only a one-line summary per session goes back to the parent, which appends
+it to sessions.csv as results come in.
+
+Usage:
+    python synthetic.py --sessions 2000 --out Synthetic --prep-shift 2
+    python synthetic.py --sessions 20 --jobs 1 --threshold 6 --seed 7
+"""
+import csv
+import math
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bird_sim import BirdSimulation, CONFIG_FILE, game_settings
+from log_schema import COLUMNS as LOG_COLUMNS, make_row, write_settings
+from psychophysics import make_method
+
+# Staircase settings, the same as Bird_Game.py
+INITIAL_INTENSITY = 2
+MIN_INTENSITY = 2
+MAX_INTENSITY = 20
+STAIRCASE_TRIALS = 20
+STEP_SIZE = 1
+RESPONSE_WINDOW_MS = 5000
+STAIRCASE_METHOD = 'quest'
+
+# Preparation window of a shot, as in Scripts/all.py
+PREP_WINDOW_START = -120
+PREP_WINDOW_END = -50
+
+SESSION_START_MS = 1.7e12  # timestamp of the first session; later ones follow a day apart
+MAX_FRAMES = 3 * 60 * 60 * 30  # three hours of play without a game over
+
+Participant = namedtuple('Participant', [
+    'threshold',          # intensity detected half of the time (between lapse and false alarm rates)
+    'threshold_sd',       # between-participant spread of the threshold
+    'slope',              # psychometric spread in intensity units
+    'lapse',              # probability of missing a clearly felt vibration
+    'guess',              # probability of reporting an unfelt vibration
+    'prep_shift',         # threshold shift in the preparation window of a shot
+    'optimal_shift',      # threshold shift inside an optimal window
+    'rt_mean',            # foot pedal reaction time (ms)
+    'rt_sd',
+    'false_alarm_rate',   # spontaneous pedal presses per second
+    'shot_interval',      # intended time between shots (ms)
+    'shot_jitter',        # SD of the shot interval (ms)
+    'aim',                # probability of waiting for an optimal window
+    'max_aim_wait',       # longest wait for a window before shooting anyway (ms)
+    'block_rate',         # probability of closing the beak against a computer shot
+    'mouth_hold',         # how long the beak stays closed (ms)
+])
+Participant.__new__.__defaults__ = (
+    4.0, 1.0, 0.8, 0.05, 0.02, 0.0, 0.0, 450.0, 120.0, 0.01,
+    900.0, 150.0, 0.6, 1500.0, 0.5, 400.0,
+)
+
+
+def session_seed(seed, subject):
+    return f"{seed}:{subject}"
+
+
+def detection_probability(participant, intensity, threshold):
+    p_felt = 1 / (1 + math.exp(-(intensity - threshold) / participant.slope))
+    return participant.guess + (1 - participant.guess - participant.lapse) * p_felt
+
+
+class SyntheticSession:
+    """One model participant playing one session; rows go to `writer`."""
+
+    def __init__(self, participant, writer, rng, start_time=SESSION_START_MS, staircase=STAIRCASE_METHOD,
+                 settings=None):
+        self.p = participant
+        self.staircase = staircase
+        # BirdSimulation arguments, as game_settings() reads them from bird_game.ini
+        self.settings = settings or {}
+        self.writer = writer
+        self.rng = rng
+        self.now = start_time
+        self.threshold = max(0.5, rng.gauss(participant.threshold, participant.threshold_sd))
+        self.rows = 0
+
+    def log(self, event, timestamp, **fields):
+        self.writer.writerow(make_row(event, timestamp, **fields))
+        self.rows += 1
+
+    def run(self):
+        threshold_intensity = self.run_staircase()
+        self.now += self.rng.uniform(5000, 30000)  # reading the game instructions
+        return self.run_game(threshold_intensity)
+
+    def run_staircase(self):
+        """The calibration of Bird_Game.run_staircase_procedure."""
+        rng, p = self.rng, self.p
+        method = make_method(self.staircase, STAIRCASE_TRIALS, INITIAL_INTENSITY,
+                             MIN_INTENSITY, MAX_INTENSITY, STEP_SIZE)
+        while not method.done():
+            self.now += rng.randint(1, 10) * 1000
+            intensity = method.next_intensity()
+            detected = rng.random() < detection_probability(p, intensity, self.threshold)
+            if detected:
+                self.now += max(100.0, rng.gauss(p.rt_mean, p.rt_sd))
+            else:
+                self.now += RESPONSE_WINDOW_MS
+            self.log("Staircase Procedure", self.now, response=int(detected), intensity=intensity)
+            method.update(intensity, int(detected))
+        return round(method.threshold(), 2)
+
+    def run_game(self, intensity):
+        rng, p = self.rng, self.p
+        sim = BirdSimulation(start_time=self.now, **self.settings)
+        frame_time = self.now
+        next_shot = frame_time + self._shot_interval()
+        aiming = rng.random() < p.aim
+        presses = []      # pending pedal press times
+        close_at = None
+        open_at = None
+        vibrations = []   # due times handed over by the simulation
+        next_false_alarm = frame_time + self._false_alarm_gap()
+
+        for _ in range(MAX_FRAMES):
+            now = frame_time
+
+            # Vibrations fire on time between frames (VibrationScheduler)
+            vibrations.extend(sim.take_vibrations())
+            vibrations.sort()
+            while vibrations and vibrations[0] <= now:
+                due = vibrations.pop(0)
+                self.log("VibrationSent", due, intensity=intensity, scheduled_time=due)
+                if self._detects(intensity, due, next_shot, sim):
+                    presses.append(due + max(100.0, rng.gauss(p.rt_mean, p.rt_sd)))
+
+            # Input of this frame, logged with the frame's time
+            while next_false_alarm <= now:
+                presses.append(next_false_alarm)
+                next_false_alarm += self._false_alarm_gap()
+            presses.sort()
+            while presses and presses[0] <= now:
+                presses.pop(0)
+                self.log("FootPedalPress", now, response=1, intensity=intensity)
+
+            if now >= next_shot:
+                optimal = sim.is_optimal(sim.predict_hole_y())
+                if not aiming or optimal or now - next_shot >= p.max_aim_wait:
+                    shot = sim.player_shoot(now)
+                    if shot:
+                        self.log("PlayerShoot", now, intensity=intensity, score=shot.data['score'],
+                                 hole_y=shot.data['current_hole_y'],
+                                 predicted_hole_y=shot.data['predicted_hole_y'],
+                                 optimal=shot.data['optimal'])
+                        next_shot = now + self._shot_interval()
+                        aiming = rng.random() < p.aim
+
+            if close_at is not None and now >= close_at:
+                sim.close_mouth(now)
+                self.log("CloseMouth", now)
+                close_at = None
+                open_at = now + p.mouth_hold
+            if open_at is not None and now >= open_at:
+                sim.open_mouth(now)
+                self.log("OpenMouth", now)
+                open_at = None
+
+            for event in sim.advance(now):
+                if event.kind == 'ComputerShoot':
+                    self.log("ComputerShoot", now, intensity=intensity)
+                    if close_at is None and open_at is None and rng.random() < p.block_rate:
+                        # Close while the food is on its way to the beak
+                        close_at = now + rng.uniform(300, 600)
+                elif event.kind in ('OptimalWindowStart', 'OptimalWindowEnd'):
+                    self.log(event.kind, now, intensity=intensity, hole_y=event.data['current_hole_y'],
+                             predicted_hole_y=event.data['predicted_hole_y'])
+            if sim.game_over:
+                break
+            frame_time += sim.frame_ms
+
+        return {'true_threshold': self.threshold, 'measured_threshold': intensity,
+                'score': sim.score, 'level': sim.current_level, 'frames': sim.tick_count,
+                'game_over': sim.game_over}
+
+    def _detects(self, intensity, due, next_shot, sim):
+        p = self.p
+        threshold = self.threshold
+        if next_shot + PREP_WINDOW_START <= due <= next_shot + PREP_WINDOW_END:
+            threshold += p.prep_shift
+        if sim.in_optimal_window:
+            threshold += p.optimal_shift
+        return self.rng.random() < detection_probability(p, intensity, threshold)
+
+    def _shot_interval(self):
+        return max(self.p.shot_interval / 4, self.rng.gauss(self.p.shot_interval, self.p.shot_jitter))
+
+    def _false_alarm_gap(self):
+        if self.p.false_alarm_rate <= 0:
+            return math.inf
+        return self.rng.expovariate(self.p.false_alarm_rate) * 1000
+
+
+def simulate_session(subject, participant, out_dir, seed, staircase=STAIRCASE_METHOD, settings=None):
+    """Writes the log of one synthetic subject and returns its summary."""
+    start = time.perf_counter()
+    filename = os.path.join(out_dir, f"experiment_responses_Subject{subject}.csv")
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(LOG_COLUMNS)
+        session = SyntheticSession(participant, writer, random.Random(session_seed(seed, subject)),
+                                   start_time=SESSION_START_MS + subject * 86_400_000, staircase=staircase,
+                                   settings=settings)
+        summary = session.run()
+    write_settings(filename, BirdSimulation(**(settings or {})).settings())
+    summary.update(subject=subject, rows=session.rows, seconds=time.perf_counter() - start)
+    return summary
+
+
+SUMMARY_COLUMNS = ['subject', 'true_threshold', 'measured_threshold', 'score', 'level', 'frames',
+                   'game_over', 'rows', 'seconds']
+
+
+def simulate_batch(sessions, participant, out_dir, seed=0, jobs=None, first_subject=1,
+                   staircase=STAIRCASE_METHOD, settings=None):
+    """Runs `sessions` synthetic subjects and writes sessions.csv with one
+    summary per subject. Returns the summaries in subject order. `settings`
+    are the game's BirdSimulation arguments (default: bird_game.ini)."""
+    if settings is None:
+        settings = game_settings()
+    os.makedirs(out_dir, exist_ok=True)
+    subjects = range(first_subject, first_subject + sessions)
+    summaries = []
+    with open(os.path.join(out_dir, "sessions.csv"), mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_COLUMNS + list(Participant._fields))
+        writer.writeheader()
+
+        def record(summary):
+            writer.writerow({**summary, **participant._asdict()})
+            file.flush()
+            summaries.append(summary)
+
+        if jobs == 1:
+            for subject in subjects:
+                record(simulate_session(subject, participant, out_dir, seed, staircase, settings))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(simulate_session, subject, participant, out_dir, seed, staircase, settings)
+                           for subject in subjects]
+                for future in as_completed(futures):
+                    record(future.result())
+    return sorted(summaries, key=lambda summary: summary['subject'])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate Feed the Bird sessions with model participants.")
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--out', default="Synthetic", help="folder for the logs and sessions.csv")
+    parser.add_argument('--seed', default=0, help="batch seed; each subject's seed derives from it")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (1 = no pool)")
+    parser.add_argument('--first-subject', type=int, default=1)
+    parser.add_argument('--staircase', default=STAIRCASE_METHOD, help="calibration method: quest, psi or updown")
+    parser.add_argument('--config', default=CONFIG_FILE, help="bird_game.ini whose [game] settings to play with")
+    parser.add_argument('--frame-rate', type=int, default=None, help="overrides the config's frame_rate")
+    defaults = Participant()
+    for name in Participant._fields:
+        parser.add_argument('--' + name.replace('_', '-'), type=float, default=getattr(defaults, name))
+    args = parser.parse_args()
+
+    participant = Participant(**{name: getattr(args, name) for name in Participant._fields})
+    settings = game_settings(args.config)
+    if args.frame_rate:
+        settings['frame_rate'] = args.frame_rate
+    start = time.perf_counter()
+    summaries = simulate_batch(args.sessions, participant, args.out, args.seed, args.jobs, args.first_subject,
+                               args.staircase, settings)
+    elapsed = time.perf_counter() - start
+    frames = sum(summary['frames'] for summary in summaries)
+    print(f"Simulated {len(summaries)} sessions ({frames} frames) in {elapsed:.1f} s -> {args.out}")
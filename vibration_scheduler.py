@@ -0,0 +1,110 @@
+"""Fires scheduled vibrations on time, independent of the game's frame rate.
+
+Due times are kept in a heap and served by a dedicated thread. The thread
+sleeps until shortly before the earliest due time and then spins on
+`time.perf_counter` for the last couple of milliseconds, so a vibration
+lands within a fraction of a millisecond of its schedule instead of on the
+next 40 ms frame. Each firing reports both the scheduled and the actual
+time, so the timing error ends up in the log. The actual time is the one
+the sender reports once the command has been written to the port, not the
+time it was handed over, so queueing in the serial worker counts as error.
+"""
+import heapq
+import itertools
+import threading
+import time
+from functools import partial
+
+SPIN_MS = 2.0  # busy-wait this long before a due time instead of sleeping
+DRAIN_TIMEOUT = 1.0  # seconds stop() waits for handed-over commands to be written
+
+
+def wall_ms():
+    return time.time() * 1000
+
+
+class VibrationScheduler:
+    """Calls `send(intensity, written)` at each scheduled wall-clock time (ms).
+
+    The sender calls `written(actual_ms)` once the command is out, from
+    whichever thread wrote it. `on_fire(scheduled_ms, actual_ms, intensity)`
+    is then called from that thread.
+    """
+
+    def __init__(self, send, on_fire=None, spin_ms=SPIN_MS):
+        self.send = send
+        self.on_fire = on_fire
+        self.spin = spin_ms / 1000
+        self.fired = []  # (scheduled_ms, actual_ms) of every vibration sent
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._unwritten = 0  # handed to `send` but not reported written yet
+        self._thread = threading.Thread(target=self._run, name="vibration-scheduler", daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self, timeout=DRAIN_TIMEOUT):
+        """Stops the thread; vibrations that are not due yet are dropped.
+        Waits up to `timeout` s for those already sent to be reported."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        with self._cond:
+            self._cond.wait_for(lambda: not self._unwritten, timeout)
+
+    def schedule(self, due_ms, intensity):
+        """Schedules a vibration at wall-clock time `due_ms`."""
+        # Convert to the perf_counter time base now, so the wait is immune to
+        # wall-clock adjustments
+        deadline = time.perf_counter() + (due_ms - wall_ms()) / 1000
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._order), due_ms, intensity))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def timing_summary(self):
+        """Mean and worst lateness (ms) of the vibrations fired so far."""
+        errors = [actual - scheduled for scheduled, actual in self.fired]
+        if not errors:
+            return {'count': 0, 'mean_error': 0.0, 'max_error': 0.0}
+        return {'count': len(errors),
+                'mean_error': sum(errors) / len(errors),
+                'max_error': max(errors)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.perf_counter()
+                    if remaining <= self.spin:
+                        break
+                    # A new, earlier vibration wakes us up through notify()
+                    self._cond.wait(remaining - self.spin)
+                if not self._running:
+                    return
+                deadline, _, due_ms, intensity = heapq.heappop(self._heap)
+
+            while time.perf_counter() < deadline:
+                pass
+            with self._cond:
+                self._unwritten += 1
+            self.send(intensity, partial(self._written, due_ms, intensity))
+
+    def _written(self, due_ms, intensity, actual_ms):
+        self.fired.append((due_ms, actual_ms))
+        if self.on_fire:
+            self.on_fire(due_ms, actual_ms, intensity)
+        with self._cond:
+            self._unwritten -= 1
+            self._cond.notify_all()